@@ -0,0 +1,123 @@
+"""
+Adaptive table-structure inference: only run TableFormer on regions that look like tables.
+
+Docling's layout model already finds the table regions on each page, and
+TableFormer only runs on pages that have one. Prose is often laid out so that
+the layout model still calls some of it a table, and every such page then pays
+for TableFormer too. In adaptive mode the page's text layer decides first: a
+table region whose text has no two cells side by side on a line is a single
+column of prose. A page whose table regions are all prose skips TableFormer, and
+each region becomes what TableFormer makes of such text anyway: a one-column
+table with a row per line. (Left without structure, docling would turn the
+region into an empty table and its text would be lost.) Any other page,
+including one with a table region that has no text to judge by, goes to
+TableFormer exactly as before, so pages with real tables come out unchanged.
+
+Importing this module pulls in TableFormer and torch, so the converter only does
+so for pipelines that ask for adaptive mode.
+"""
+from typing import Iterable, List
+
+from docling.datamodel.base_models import Cell, Cluster, Page, Table, TableStructurePrediction
+from docling.datamodel.document import ConversionResult
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.models.base_model import BasePageModel
+from docling.models.table_structure_model import TableStructureModel
+from docling.pipeline.standard_pdf_pipeline import StandardPdfPipeline
+from docling_core.types.doc import DocItemLabel, TableCell
+
+# Share of a text cell's area that must lie in a table region for it to count,
+# the same rule TableFormer uses to pick the cells it matches
+CELL_OVERLAP = 0.2
+
+# Share of the shorter cell's height two cells must share to be on the same line
+LINE_OVERLAP = 0.5
+
+
+def _region_cells(page: Page, cluster: Cluster) -> List[Cell]:
+    """The page's non-empty text cells inside a table region."""
+    cells = []
+    for cell in page.cells:
+        area = cell.bbox.area()
+        if area > 0 and cell.text.strip() and \
+                cell.bbox.intersection_area_with(cluster.bbox) / area > CELL_OVERLAP:
+            cells.append(cell)
+    return cells
+
+
+def _has_columns(cells: List[Cell]) -> bool:
+    """Whether any two cells sit side by side on the same line."""
+    # Sorted by top edge, a cell can only share a line with the cells after it
+    # until one starts below its bottom edge
+    boxes = sorted(
+        (min(cell.bbox.t, cell.bbox.b), max(cell.bbox.t, cell.bbox.b), cell.bbox.l, cell.bbox.r)
+        for cell in cells
+    )
+    for i, (top, bottom, left, right) in enumerate(boxes):
+        for other_top, other_bottom, other_left, other_right in boxes[i + 1:]:
+            if other_top >= bottom:
+                break
+            shared = min(bottom, other_bottom) - other_top
+            if shared < LINE_OVERLAP * min(bottom - top, other_bottom - other_top):
+                continue
+            if other_left >= right or left >= other_right:
+                return True
+    return False
+
+
+def needs_table_structure(page: Page) -> bool:
+    """Whether any table region on the page has text in columns, or no text layer to tell."""
+    for cluster in page.predictions.layout.clusters:
+        if cluster.label != DocItemLabel.TABLE:
+            continue
+        cells = _region_cells(page, cluster)
+        if not cells or _has_columns(cells):
+            return True
+    return False
+
+
+def single_column_table(page: Page, cluster: Cluster) -> Table:
+    """A table region of prose as a one-column table with a row per line of text.
+
+    The region has no two cells on the same line, so each cell is a line.
+    """
+    cells = sorted(_region_cells(page, cluster), key=lambda cell: (min(cell.bbox.t, cell.bbox.b), cell.bbox.l))
+    table_cells = [
+        TableCell(bbox=cell.bbox, text=cell.text, row_span=1, col_span=1,
+                  start_row_offset_idx=row, end_row_offset_idx=row + 1,
+                  start_col_offset_idx=0, end_col_offset_idx=1)
+        for row, cell in enumerate(cells)
+    ]
+    return Table(label=DocItemLabel.TABLE, id=cluster.id, page_no=page.page_no, cluster=cluster,
+                 otsl_seq=["fcel", "nl"] * len(cells), num_rows=len(cells), num_cols=1,
+                 table_cells=table_cells)
+
+
+class AdaptiveTableStructureModel(BasePageModel):
+    """Runs a TableStructureModel only on the pages that need it."""
+
+    def __init__(self, model: TableStructureModel):
+        self.model = model
+
+    def __call__(self, conv_res: ConversionResult, page_batch: Iterable[Page]) -> Iterable[Page]:
+        for page in page_batch:
+            if (not self.model.enabled or page._backend is None or not page._backend.is_valid()
+                    or page.predictions.layout is None or needs_table_structure(page)):
+                yield from self.model(conv_res, [page])
+            else:
+                page.predictions.tablestructure = TableStructurePrediction(table_map={
+                    cluster.id: single_column_table(page, cluster)
+                    for cluster in page.predictions.layout.clusters if cluster.label == DocItemLabel.TABLE
+                })
+                yield page
+
+
+class AdaptivePdfPipeline(StandardPdfPipeline):
+    """Docling's standard PDF pipeline with adaptive table-structure inference."""
+
+    def __init__(self, pipeline_options: PdfPipelineOptions):
+        super().__init__(pipeline_options)
+        self.build_pipe = [
+            AdaptiveTableStructureModel(model) if isinstance(model, TableStructureModel) else model
+            for model in self.build_pipe
+        ]
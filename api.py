@@ -4,66 +4,220 @@ import os
 import tempfile
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Literal, Optional, Tuple
+from urllib.parse import urlparse
 
-import httpx
 import uvicorn
-from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from fastapi import FastAPI, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from docling_core.types.doc import DoclingDocument
+from fastapi import Body, FastAPI, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from cache import ConversionCache
+from converter import build_pipeline_options
+from fetcher import FetchError, PdfFetcher, PdfTooLargeError, build_client, read_limited
+import metrics
+from jobs import COMPLETED, FINISHED_STATES, JobScheduler, SqliteJobStore
+from logs import configure_logging, get_logger, levels, request_context, set_levels
+from logs import request_id as request_id_var
+from recipes.base import ConversionRecipe
 from recipes.registry import registry
+from metrics import StageRecorder, record_stages, stage
+from section_index import StaleIndexError, find_paragraphs, find_sections, read_spans
+from sharding import parse_page_range
+from store import STORE_DIR, DocumentStore
+from workers import ConversionLimitError, ConversionPool, ConversionTimeoutError, PoolSaturatedError
 
-# Global variable to store the converter
-doc_converter = None
+configure_logging()
+log = get_logger(__name__)
+
+# Seconds a client is asked to wait when the conversion queue is full
+RETRY_AFTER = int(os.environ.get("UNPDF_RETRY_AFTER", "5"))
+
+# Accept requests straight away and let the workers load their models in the background
+COLD_START = os.environ.get("UNPDF_COLD_START", "0") == "1"
+
+# Largest PDF accepted for conversion, in bytes
+MAX_UPLOAD_BYTES = int(os.environ.get("UNPDF_MAX_UPLOAD_BYTES", str(512 * 1024 ** 2)))
+
+# Allowance for multipart framing when checking a request's Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Endpoints taking several PDFs in one request, each held to the size limit on its own
+MULTI_FILE_PATHS = {"/convert/batch"}
+
+# Largest request, in bytes, and most files accepted by the multi-file endpoints
+MAX_BATCH_BYTES = int(os.environ.get("UNPDF_MAX_BATCH_BYTES", str(2 * 1024 ** 3)))
+MAX_BATCH_FILES = int(os.environ.get("UNPDF_MAX_BATCH_FILES", "100"))
+
+CHUNK_SIZE = 1024 * 1024
+
+# Per-request profiling: a stage breakdown, or that plus cProfile output
+Profile = Optional[Literal["stages", "cprofile"]]
+
+# Separators for compact output, as Starlette's JSONResponse uses
+COMPACT_SEPARATORS = (",", ":")
+
+# Per-request pipeline overrides; unset means the recipe's default
+TableStructure = Optional[Literal["on", "auto", "off"]]
+TableMode = Optional[Literal["fast", "accurate"]]
+
+# Where job records, inputs and results are kept
+JOB_DIR = os.environ.get("UNPDF_JOB_DIR", os.path.join(tempfile.gettempdir(), "unpdf-jobs"))
+
+# Global variables to store the worker pool, job scheduler and URL fetcher
+conversion_pool = None
+job_scheduler = None
+url_fetcher = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager for the FastAPI application"""
-    global doc_converter
-    
-    # Initialize converter with options
-    pipeline_options = PdfPipelineOptions()
-    pipeline_options.do_ocr = False
-    pipeline_options.do_table_structure = True
-    
-    doc_converter = DocumentConverter(
-        allowed_formats=[InputFormat.PDF],
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-            ),
-        },
+    global conversion_pool, job_scheduler, url_fetcher
+    
+    # Start the workers; each builds and warms its own converter
+    conversion_pool = ConversionPool(cache=ConversionCache(),
+                                     store=DocumentStore(STORE_DIR) if STORE_DIR else None)
+    await asyncio.get_running_loop().run_in_executor(None, conversion_pool.start, not COLD_START)
+    if COLD_START:
+        log.info(f"Starting {conversion_pool.workers} conversion workers in the background",
+                 extra={"workers": conversion_pool.workers})
+    else:
+        log.info(f"Started {conversion_pool.workers} conversion workers",
+                 extra={"workers": conversion_pool.workers})
+    
+    # One pooled HTTP client for every URL download
+    url_fetcher = PdfFetcher(
+        build_client(),
+        digest=ConversionCache.pdf_digest,
+        max_bytes=MAX_UPLOAD_BYTES,
     )
     
-    # Warm up the models by processing a small sample PDF
-    try:
-        # Create a minimal PDF file for warmup
-        sample_path = Path("warmup.pdf")
-        if not sample_path.exists():
-            from reportlab.pdfgen import canvas
-            c = canvas.Canvas(str(sample_path))
-            c.drawString(100, 750, "Warmup document")
-            c.save()
-        
-        # Process it to load models
-        _ = doc_converter.convert(str(sample_path))
-        
-        # Clean up
-        os.unlink(str(sample_path))
-        
-        print("Models loaded successfully")
-    except Exception as e:
-        print(f"Warning: Model warmup failed: {e}")
-        # Continue anyway - models will load on first request
+    job_scheduler = JobScheduler(conversion_pool, SqliteJobStore(JOB_DIR))
+    job_scheduler.start()
     
     yield  # Server is running
     
-    # Cleanup (if needed) when server shuts down
-    if sample_path.exists():
-        os.unlink(str(sample_path))
+    # Stop the jobs, HTTP client and workers when the server shuts down
+    await job_scheduler.stop()
+    await url_fetcher.client.aclose()
+    conversion_pool.shutdown()
+
+def queue_full_error() -> HTTPException:
+    """503 response telling the client when to retry"""
+    return HTTPException(
+        status_code=503,
+        detail="Conversion queue is full, please retry later",
+        headers={"Retry-After": str(RETRY_AFTER)},
+    )
+
+def limit_error(error: ConversionLimitError) -> HTTPException:
+    """504 response for a conversion that ran out of time, 413 for one over a page or memory limit"""
+    return HTTPException(status_code=504 if isinstance(error, ConversionTimeoutError) else 413, detail=str(error))
+
+def too_large_error() -> HTTPException:
+    """413 response for a PDF over the size limit"""
+    return HTTPException(
+        status_code=413,
+        detail=f"PDF is larger than the {MAX_UPLOAD_BYTES} byte limit",
+    )
+
+async def upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an uploaded file in chunks"""
+    while chunk := await file.read(CHUNK_SIZE):
+        yield chunk
+
+def url_document_name(url: str) -> str:
+    """Name for a document downloaded from a URL: the file name without its extension"""
+    return Path(urlparse(url).path).stem
+
+def request_pipeline_options(conversion_recipe: ConversionRecipe, table_structure: TableStructure = None,
+                             table_mode: TableMode = None, ocr: bool = None) -> PdfPipelineOptions:
+    """The recipe's pipeline options, with any given in the request applied on top"""
+    overrides = {
+        name: value for name, value in (("table_structure", table_structure),
+                                        ("table_mode", table_mode), ("ocr", ocr))
+        if value is not None
+    }
+    return build_pipeline_options(**{**conversion_recipe.pipeline_defaults, **overrides})
+
+def request_page_range(pages: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse a page range query parameter, rejecting an invalid one with a 400"""
+    if pages is None:
+        return None
+    try:
+        return parse_page_range(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def fetch_document(url: str, pipeline_options: PdfPipelineOptions, shard_pages: int = None,
+                         pages: Tuple[int, int] = None, check_backlog: bool = True) -> DoclingDocument:
+    """Download and convert a PDF, skipping both when it hasn't changed since it was last converted
+    
+    check_backlog is passed on to convert_document, for callers that bound their own conversions.
+    """
+    with stage("download"):
+        content, digest = await url_fetcher.fetch(url)
+    
+    if content is None:
+        key = ConversionCache.make_key(digest, pipeline_options, pages)
+        document = await asyncio.to_thread(conversion_pool.cache.get, key)
+        if document is not None:
+            # As convert_document does for a cache hit, e.g. if the store was enabled since
+            await conversion_pool.store_document(key, document, url_document_name(url), pages)
+            return document
+        # Not converted with these options, or since evicted, so the PDF is needed after all
+        with stage("download"):
+            content, digest = await url_fetcher.fetch(url, revalidate=False)
+    
+    return await conversion_pool.convert_document(content, shard_pages=shard_pages,
+                                                  name=url_document_name(url), digest=digest,
+                                                  pipeline_options=pipeline_options, pages=pages,
+                                                  check_backlog=check_backlog)
+
+def ndjson_sections(conversion_recipe: ConversionRecipe, document) -> Iterator[str]:
+    """Encode a recipe's output as NDJSON, one top-level section per line"""
+    separators = COMPACT_SEPARATORS if conversion_recipe.compact else None
+    for section in conversion_recipe.iter_sections(document):
+        yield json.dumps(section, ensure_ascii=False, separators=separators) + "\n"
+
+def ndjson_as_completed(results: Iterable[Awaitable[dict]], compact: bool = False) -> StreamingResponse:
+    """Run conversions concurrently and stream each result as an NDJSON line as soon as it is ready"""
+    separators = COMPACT_SEPARATORS if compact else None
+    async def lines() -> AsyncIterator[str]:
+        # Tasks are started in order, so the first given are the first to get a worker
+        tasks = [asyncio.create_task(result) for result in results]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task, ensure_ascii=False, separators=separators) + "\n"
+        finally:
+            # Stop converting if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def build_response(conversion_recipe: ConversionRecipe, document: DoclingDocument, stream: bool,
+                         recorder: StageRecorder = None) -> Response:
+    """Apply a recipe to a converted document and encode the response"""
+    if stream:
+        # Send each section as the recipe produces it
+        return StreamingResponse(
+            ndjson_sections(conversion_recipe, document),
+            media_type="application/x-ndjson",
+        )
+    
+    simplified_doc = await asyncio.to_thread(conversion_recipe.simplify_document, document)
+    
+    with stage("encode"):
+        body = JSONResponse(content=simplified_doc).body
+    
+    if recorder is not None:
+        # Append the profile to the encoded object, so it can include the encoding time
+        body = body[:-1] + b',"profile":' + JSONResponse(content=recorder.as_dict()).body + b'}'
+    
+    return Response(content=body, media_type="application/json")
 
 app = FastAPI(
     title="PDF to JSON Converter API",
@@ -72,96 +226,489 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Registered first, so it runs inside attach_request_id and its 413s carry the request id
+@app.middleware("http")
+async def reject_oversized_requests(request: Request, call_next):
+    """Turn away uploads whose Content-Length is over the size limit before reading the body.
+
+    Batch uploads hold several PDFs, so they are held to the batch limit as a whole,
+    and their files to the upload limit one by one. Their whole body is spooled to
+    disk before the endpoint runs, so they must give a Content-Length.
+    """
+    content_length = request.headers.get("content-length", "")
+    if request.url.path in MULTI_FILE_PATHS:
+        if request.method == "POST" and not content_length.isdigit():
+            return JSONResponse(status_code=411, content={"detail": "Batch uploads need a Content-Length"})
+        if int(content_length or 0) > MAX_BATCH_BYTES + MULTIPART_OVERHEAD:
+            return JSONResponse(status_code=413,
+                                content={"detail": f"Batch is larger than the {MAX_BATCH_BYTES} byte limit"})
+    elif content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        return JSONResponse(status_code=413, content={"detail": too_large_error().detail})
+    return await call_next(request)
+
+@app.middleware("http")
+async def attach_request_id(request: Request, call_next):
+    """Tag everything logged for a request with its X-Request-ID, or a new id, and return the id"""
+    with request_context(request.headers.get("x-request-id", "")[:64] or None) as request_id:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    # call_next returns once the response starts, so a streamed body, e.g. NDJSON
+    # conversions, is produced after the block above has ended
+    response.body_iterator = body_in_request_context(response.body_iterator, request_id)
+    return response
+
+async def body_in_request_context(body: AsyncIterator[bytes], value: str) -> AsyncIterator[bytes]:
+    """Stream a response body with its request id attached to everything logged meanwhile"""
+    # Set rather than entered as a block: the task streaming the body serves only this
+    # response, and the generator may be closed from another task, where a reset fails
+    request_id_var.set(value)
+    async for chunk in body:
+        yield chunk
+
 @app.get("/")
 async def get_viewer():
     """Serve the JSON viewer interface"""
     return FileResponse('json-viewer.html')
 
 @app.post("/convert/upload")
-async def convert_uploaded_pdf(file: UploadFile, recipe: str = "default"):
-    """Convert an uploaded PDF file to JSON using specified recipe"""
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="File must be a PDF")
+async def convert_uploaded_pdf(request: Request, file: UploadFile = None, recipe: str = "default",
+                               stream: bool = False, shard_pages: int = None, profile: Profile = None,
+                               table_structure: TableStructure = None, table_mode: TableMode = None,
+                               ocr: bool = None, pages: str = None, compact: bool = False):
+    """Convert an uploaded PDF file to JSON using specified recipe, or to NDJSON sections if stream is set
     
+    The PDF is sent as multipart form data, or as the raw request body with
+    Content-Type application/pdf, which is streamed without being spooled to disk.
+    table_structure, table_mode and ocr override the recipe's pipeline options,
+    and pages (e.g. 3-10) converts only that page range. compact encodes tables
+    as columns of deduplicated strings.
+    """
+    page_range = request_page_range(pages)
+    if file is None:
+        if request.headers.get("content-type", "").split(";")[0].strip() != "application/pdf":
+            raise HTTPException(status_code=400, detail="Send a PDF file or an application/pdf body")
+        chunks, name = request.stream(), "document"
+    elif not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    else:
+        chunks, name = upload_chunks(file), Path(file.filename).stem
+    # Get the requested recipe before queueing
     try:
-        # Create temporary file to store the upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        # Get the requested recipe
-        conversion_recipe = registry.get_recipe(recipe)
-        
-        # Process the PDF
-        result = doc_converter.convert(tmp_path)
-        simplified_doc = conversion_recipe.simplify_document(result.document)
-        
-        # Clean up
-        os.unlink(tmp_path)
-        
-        return JSONResponse(content=simplified_doc)
+        conversion_recipe = registry.get_recipe(recipe, compact=compact)
+        pipeline_options = request_pipeline_options(conversion_recipe, table_structure, table_mode, ocr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if conversion_pool.saturated:
+        raise queue_full_error()
+    
+    with record_stages(cprofile=profile == "cprofile") as recorder:
+        try:
+            with stage("upload"):
+                content = await read_limited(chunks, MAX_UPLOAD_BYTES)
+            
+            document = await conversion_pool.convert_document(content, shard_pages=shard_pages, name=name,
+                                                              pipeline_options=pipeline_options,
+                                                              pages=page_range)
+            return await build_response(conversion_recipe, document, stream, recorder if profile else None)
         
-    except Exception as e:
-        # Clean up on error
-        if 'tmp_path' in locals():
-            os.unlink(tmp_path)
-        raise HTTPException(status_code=500, detail=str(e))
+        except PdfTooLargeError:
+            raise too_large_error()
+        except ConversionLimitError as e:
+            raise limit_error(e)
+        except PoolSaturatedError:
+            raise queue_full_error()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/convert/url")
-async def convert_pdf_from_url(url: str, recipe: str = "default"):
-    """Convert a PDF from a URL to JSON using specified recipe"""
+async def convert_pdf_from_url(url: str, recipe: str = "default", stream: bool = False,
+                               shard_pages: int = None, profile: Profile = None,
+                               table_structure: TableStructure = None, table_mode: TableMode = None,
+                               ocr: bool = None, pages: str = None, compact: bool = False):
+    """Convert a PDF from a URL to JSON using specified recipe, or to NDJSON sections if stream is set
+    
+    Takes the same pipeline overrides, page range and compact option as /convert/upload.
+    """
+    page_range = request_page_range(pages)
     if not url.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="URL must point to a PDF file")
-    
+    # Get the requested recipe before queueing
     try:
-        # Download the PDF
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to download PDF")
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(response.content)
-                tmp_path = tmp_file.name
-        
-        # Get the requested recipe
-        conversion_recipe = registry.get_recipe(recipe)
-        
-        # Process the PDF
-        result = doc_converter.convert(tmp_path)
-        simplified_doc = conversion_recipe.simplify_document(result.document)
-        
-        # Clean up
-        os.unlink(tmp_path)
+        conversion_recipe = registry.get_recipe(recipe, compact=compact)
+        pipeline_options = request_pipeline_options(conversion_recipe, table_structure, table_mode, ocr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if conversion_pool.saturated:
+        raise queue_full_error()
+    
+    with record_stages(cprofile=profile == "cprofile") as recorder:
+        try:
+            document = await fetch_document(url, pipeline_options, shard_pages, page_range)
+            return await build_response(conversion_recipe, document, stream, recorder if profile else None)
         
-        return JSONResponse(content=simplified_doc)
+        except FetchError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except PdfTooLargeError:
+            raise too_large_error()
+        except ConversionLimitError as e:
+            raise limit_error(e)
+        except PoolSaturatedError:
+            raise queue_full_error()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/convert/urls")
+async def convert_pdfs_from_urls(urls: List[str] = Body(..., embed=True), recipe: str = "default",
+                                 table_structure: TableStructure = None, table_mode: TableMode = None,
+                                 ocr: bool = None, compact: bool = False):
+    """Convert a list of PDF URLs, streaming one NDJSON line per URL as each finishes
+    
+    URLs are downloaded concurrently, up to UNPDF_FETCH_PER_HOST at a time from any
+    one host, and converted on the worker pool.
+    """
+    if not urls:
+        raise HTTPException(status_code=400, detail="Provide at least one URL")
+    for url in urls:
+        if not url.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail=f"URL must point to a PDF file: {url}")
+    try:
+        conversion_recipe = registry.get_recipe(recipe, compact=compact)
+        pipeline_options = request_pipeline_options(conversion_recipe, table_structure, table_mode, ocr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if conversion_pool.saturated:
+        raise queue_full_error()
+    
+    # Enough PDFs in flight to keep every worker busy while the next ones download,
+    # without holding the whole batch in memory
+    in_flight = asyncio.Semaphore(conversion_pool.workers * 2)
+    
+    async def convert_one(index: int, url: str) -> dict:
+        async with in_flight:
+            try:
+                # The batch bounds its own conversions, so it isn't turned away by others filling the queue
+                document = await fetch_document(url, pipeline_options, check_backlog=False)
+                simplified_doc = await asyncio.to_thread(conversion_recipe.simplify_document, document)
+                return {"index": index, "url": url, **simplified_doc}
+            except Exception as e:
+                return {"index": index, "url": url, "error": str(e)}
+    
+    return ndjson_as_completed((convert_one(index, url) for index, url in enumerate(urls)), compact)
+
+@app.post("/convert/batch")
+async def convert_uploaded_batch(files: List[UploadFile], recipe: str = "default",
+                                 table_structure: TableStructure = None, table_mode: TableMode = None,
+                                 ocr: bool = None, compact: bool = False):
+    """Convert many uploaded PDFs together, streaming one NDJSON line per file as each finishes
+    
+    Files are converted largest first across the workers, which keeps the batch's
+    total time down. A file that fails is reported in its line without stopping the rest.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Batch has more than {MAX_BATCH_FILES} files")
+    try:
+        conversion_recipe = registry.get_recipe(recipe, compact=compact)
+        pipeline_options = request_pipeline_options(conversion_recipe, table_structure, table_mode, ocr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if conversion_pool.saturated:
+        raise queue_full_error()
+    
+    # One conversion per worker; the rest wait their turn, largest first
+    slots = asyncio.Semaphore(conversion_pool.workers)
+    
+    async def convert_one(index: int, file: UploadFile) -> dict:
+        async with slots:
+            try:
+                if not file.filename.lower().endswith('.pdf'):
+                    raise ValueError("File must be a PDF")
+                # Read only once it has a worker, so the batch isn't all held in memory at once
+                content = await read_limited(upload_chunks(file), MAX_UPLOAD_BYTES)
+                # The batch bounds its own conversions, so it isn't turned away by others filling the queue
+                document = await conversion_pool.convert_document(content, name=Path(file.filename).stem,
+                                                                  pipeline_options=pipeline_options,
+                                                                  check_backlog=False)
+                del content
+                simplified_doc = await asyncio.to_thread(conversion_recipe.simplify_document, document)
+                return {"index": index, "filename": file.filename, **simplified_doc}
+            except Exception as e:
+                return {"index": index, "filename": file.filename, "error": str(e)}
+    
+    # The uploads stay open until the response has been sent, so they are read as they are converted
+    uploads = sorted(enumerate(files), key=lambda upload: upload[1].size or 0, reverse=True)
+    return ndjson_as_completed((convert_one(index, file) for index, file in uploads), compact)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = None, url: str = None, recipe: str = "default"):
+    """Queue an uploaded PDF or a PDF URL for conversion and return the job immediately"""
+    if (file is None) == (url is None):
+        raise HTTPException(status_code=400, detail="Provide either a file or a url")
+    if file is not None and not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    if url is not None and not url.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="URL must point to a PDF file")
+    
+    try:
+        registry.get_recipe(recipe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if file is not None:
+        # Read the upload now; the request's file is gone once we return
+        try:
+            content = await read_limited(upload_chunks(file), MAX_UPLOAD_BYTES)
+        except PdfTooLargeError:
+            raise too_large_error()
+    
+    job = await job_scheduler.create_job(recipe, source=file.filename if file else url)
+    
+    if file is not None:
+        await asyncio.to_thread(Path(job_scheduler.store.input_path(job["id"])).write_bytes, content)
+        job_scheduler.submit(job["id"])
+    else:
+        # Download in the background so the client isn't kept waiting
+        async def fetch(path: str) -> None:
+            content, _ = await url_fetcher.fetch(url, revalidate=False)
+            await asyncio.to_thread(Path(path).write_bytes, content)
         
-    except Exception as e:
-        # Clean up on error
-        if 'tmp_path' in locals():
-            os.unlink(tmp_path)
-        raise HTTPException(status_code=500, detail=str(e))
+        job_scheduler.submit(job["id"], fetch=fetch)
+    
+    return await job_scheduler.status(job["id"])
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report a job's status and timing"""
+    job = await job_scheduler.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Return the simplified JSON produced by a completed job"""
+    job = await job_scheduler.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    
+    result = await asyncio.to_thread(job_scheduler.store.load_result, job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result has expired")
+    return JSONResponse(content=result)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = await job_scheduler.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in FINISHED_STATES or not await job_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    
+    return await job_scheduler.status(job_id)
+
+@app.post("/resimplify")
+async def resimplify_documents(recipe: str = "default", compact: bool = False, workers: int = None):
+    """Rerun a recipe over every document in the store, without converting, and report the run
+    
+    Outputs are written under outputs/<recipe> in the store (outputs/<recipe>-compact
+    with compact); documents whose output is already current are skipped.
+    """
+    if conversion_pool.store is None:
+        raise HTTPException(status_code=400, detail="No document store: set UNPDF_STORE_DIR")
+    try:
+        registry.get_recipe(recipe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    from resimplify import run_resimplify
+    return await asyncio.to_thread(run_resimplify, str(conversion_pool.store.directory), recipe=recipe,
+                                   workers=workers, compact=compact)
+
+async def stored_output(name: str, recipe: str, compact: bool) -> Tuple[Path, dict]:
+    """A stored document's indexed output for a recipe, made now if it isn't current"""
+    if conversion_pool.store is None:
+        raise HTTPException(status_code=400, detail="No document store: set UNPDF_STORE_DIR")
+    try:
+        registry.get_recipe(recipe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    from resimplify import simplified_output
+    found = await asyncio.to_thread(simplified_output, conversion_pool.store, name, recipe, compact)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return found
+
+async def read_stored_spans(name: str, recipe: str, compact: bool, pick: Callable[[dict], list]) -> Response:
+    """The byte ranges pick chooses from a stored document's output, as a JSON array
+    
+    If the output is rewritten between reading its index and slicing it, the index
+    is read again, once, before giving up with a 503.
+    """
+    for _ in range(2):
+        output_path, index = await stored_output(name, recipe, compact)
+        try:
+            body = await asyncio.to_thread(read_spans, output_path, index, pick(index))
+        except StaleIndexError:
+            continue
+        return Response(content=body, media_type="application/json")
+    raise HTTPException(
+        status_code=503,
+        detail="Document output is being rewritten, please retry",
+        headers={"Retry-After": str(RETRY_AFTER)},
+    )
+
+@app.get("/documents")
+async def list_documents():
+    """List the documents in the store"""
+    if conversion_pool.store is None:
+        raise HTTPException(status_code=400, detail="No document store: set UNPDF_STORE_DIR")
+    entries = await asyncio.to_thread(conversion_pool.store.entries)
+    return {
+        "documents": [
+            {"name": name, "pages": entry["pages"], "stored_at": entry["stored_at"]}
+            for name, entry in sorted(entries.items())
+        ]
+    }
+
+@app.get("/documents/{name:path}/sections")
+async def get_document_sections(name: str, title: str = None, recipe: str = "default", compact: bool = False):
+    """List a stored document's sections, or return those with a title, subsections included
+    
+    A title matches sections with exactly that title or, failing any, those whose
+    title starts with it, so title=IAS 36 finds "IAS 36 Impairment of Assets".
+    Sections are read straight out of the stored output, without loading the rest.
+    """
+    if title is None:
+        _, index = await stored_output(name, recipe, compact)
+        numbers = [[] for _ in index["sections"]]
+        for number, _, _, section_no in index["paragraphs"]:
+            numbers[section_no].append(number)
+        return {
+            "sections": [
+                {"title": section["title"], "path": section["path"], "level": section["level"],
+                 "paragraphs": section_numbers}
+                for section, section_numbers in zip(index["sections"], numbers)
+            ]
+        }
+    
+    def pick(index: dict) -> list:
+        sections = find_sections(index, title)
+        if not sections:
+            raise HTTPException(status_code=404, detail="No section with that title")
+        return [(section["start"], section["end"]) for section in sections]
+    
+    return await read_stored_spans(name, recipe, compact, pick)
+
+@app.get("/documents/{name:path}/paragraphs/{number}")
+async def get_document_paragraphs(name: str, number: int, section: str = None, recipe: str = "default",
+                                  compact: bool = False):
+    """Return a stored document's paragraphs with a number, optionally only those in a section
+    
+    Numbering usually restarts in each standard, so pass section (matched as for
+    /sections) to pick one. Paragraphs are read straight out of the stored output.
+    """
+    def pick(index: dict) -> list:
+        sections = None
+        if section is not None:
+            sections = find_sections(index, section)
+            if not sections:
+                raise HTTPException(status_code=404, detail="No section with that title")
+        spans = find_paragraphs(index, number, sections)
+        if not spans:
+            raise HTTPException(status_code=404, detail="No paragraph with that number")
+        return spans
+    
+    return await read_stored_spans(name, recipe, compact, pick)
+
+@app.get("/documents/{name:path}")
+async def get_document(name: str, recipe: str = "default", compact: bool = False):
+    """Return a stored document's whole output for a recipe"""
+    output_path, _ = await stored_output(name, recipe, compact)
+    return FileResponse(output_path, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
+    """Health check endpoint: whether the workers have loaded their models or died, the queue and memory use"""
+    return {
+        "status": "healthy",
+        "ready": conversion_pool.ready,
+        "workers_ready": conversion_pool.workers_ready,
+        "workers_broken": conversion_pool.workers_broken,
+        "workers": conversion_pool.workers,
+        "workers_recycled": conversion_pool.workers_recycled,
+        "saturated": conversion_pool.saturated,
+        "queue": {"pending": conversion_pool.pending, "capacity": conversion_pool.capacity},
+        "memory": {
+            "api_rss_bytes": metrics.current_rss_bytes(),
+            "worker_rss_bytes": conversion_pool.worker_rss(),
+            "worker_max_rss_bytes": conversion_pool.limits.worker_max_rss or None,
+        },
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once every worker has loaded its models, 503 until then or while the queue is full"""
+    if not conversion_pool.ready:
+        raise HTTPException(status_code=503, detail="Workers are loading models")
+    if conversion_pool.saturated:
+        raise queue_full_error()
+    return {"status": "ready"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Conversion cache hit/miss counters and sizes"""
+    return conversion_pool.cache.stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Conversion metrics in the Prometheus text format"""
+    metrics.pending_conversions.set(conversion_pool.pending)
+    # Read off the event loop: the kernel walks every mapping of each worker to work it out
+    worker_memory = await asyncio.to_thread(conversion_pool.worker_memory)
+    metrics.worker_memory.clear()
+    for pid, memory in worker_memory.items():
+        for kind, value in memory.items():
+            metrics.worker_memory.set(value, pid=pid, kind=kind)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/recipes")
 async def list_recipes():
-    """List all available conversion recipes"""
+    """List all available conversion recipes, without importing them"""
     return {
         "recipes": [
             {
                 "name": name,
-                "description": registry.get_recipe(name).__class__.__doc__ or ""
+                "description": registry.describe(name)
             }
             for name in registry.list_recipes()
         ]
     }
 
+@app.post("/recipes/reload")
+async def reload_recipes():
+    """Pick up added, removed and edited recipes without restarting or reloading models"""
+    try:
+        reloaded = await asyncio.to_thread(registry.reload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reloading recipes failed: {type(e).__name__}: {e}")
+    return {"reloaded": reloaded, "recipes": registry.list_recipes()}
+
+@app.get("/logging")
+async def get_log_levels():
+    """Log levels of the API process"""
+    return {"levels": levels()}
+
+@app.post("/logging")
+async def set_log_levels(level: str):
+    """Change log levels without restarting, e.g. level=unpdf.recipes=DEBUG to trace the recipes"""
+    try:
+        return {"levels": set_levels(level)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/demo")
 @app.post("/demo")
 async def demo_endpoint(time: int = 0):
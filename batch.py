@@ -0,0 +1,259 @@
+"""
+Batch conversion of many PDFs across worker processes, with a resumable progress manifest.
+
+A PDF that kills its worker process (the kernel's OOM killer, a crash in native
+code) breaks the whole process pool, failing every conversion in it. The pool is
+then rebuilt and the files that were converting are run again one at a time, so
+the one that crashed is recorded as failed and the rest of the batch carries on.
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+
+from cache import ConversionCache
+from converter import build_converter, build_pipeline_options
+from logs import configure_logging, get_logger
+from recipes.registry import registry
+from unpdf import process_pdf
+
+log = get_logger(__name__)
+
+# Converter and conversion cache owned by this worker process, made once by the pool initializer
+_converter = None
+_cache = None
+
+
+def _init_worker(pipeline_options: PdfPipelineOptions, use_cache: bool) -> None:
+    """Load the models, and open the cache, once for every file this worker converts."""
+    global _converter, _cache
+    configure_logging()
+    _converter = build_converter(pipeline_options)
+    _cache = ConversionCache(memory_items=0) if use_cache else None
+
+
+def _convert_file(pdf_path: str, output_path: str, recipe: str, stream: bool,
+                  use_cache: bool, pipeline_options: PdfPipelineOptions, compact: bool,
+                  store: str, name: str) -> Dict[str, Any]:
+    """Convert one PDF inside a worker, reporting the outcome rather than raising."""
+    start = time.perf_counter()
+    try:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        document = process_pdf(pdf_path, output_path, recipe=recipe, use_cache=use_cache,
+                               stream=stream, doc_converter=_converter,
+                               pipeline_options=pipeline_options, compact=compact,
+                               store=store, name=name, cache=_cache)
+        return {"status": "done", "pages": document.num_pages(),
+                "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}",
+                "seconds": round(time.perf_counter() - start, 3)}
+
+
+def _new_executor(workers: int, pipeline_options: PdfPipelineOptions, use_cache: bool) -> ProcessPoolExecutor:
+    """Pool of worker processes that each load the models once."""
+    # Spawn rather than fork: each worker loads its own models, and a forked one would
+    # inherit torch's thread pool if this process had started it (see workers.py)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(pipeline_options, use_cache))
+
+
+def _run_surviving_crashes(tasks: List[Tuple[Any, tuple]], workers: int, pipeline_options: PdfPipelineOptions,
+                           use_cache: bool) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+    """Run (key, _convert_file arguments) tasks, yielding each key with its result as it finishes.
+
+    No more tasks than workers are submitted at once, so those lost when the pool
+    breaks are the ones that were converting. They are rerun alone in a new pool:
+    one that breaks that too is reported as failed.
+    """
+    queue = deque(tasks)
+    # Tasks lost to a broken pool, to be rerun one at a time
+    suspects = deque()
+    running: Dict[Future, Tuple[Tuple[Any, tuple], bool]] = {}
+    executor = _new_executor(workers, pipeline_options, use_cache)
+    try:
+        while queue or suspects or running:
+            if suspects:
+                if not running:
+                    task = suspects.popleft()
+                    running[executor.submit(_convert_file, *task[1])] = (task, True)
+            else:
+                while queue and len(running) < workers:
+                    task = queue.popleft()
+                    running[executor.submit(_convert_file, *task[1])] = (task, False)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                task, alone = running.pop(future)
+                try:
+                    yield task[0], future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if alone:
+                        yield task[0], {"status": "failed", "error": "BrokenProcessPool: the worker process died",
+                                        "seconds": 0.0}
+                    else:
+                        suspects.append(task)
+            if broken:
+                # The others converting in the broken pool fail as well
+                for future in wait(running).done:
+                    task, _ = running.pop(future)
+                    try:
+                        yield task[0], future.result()
+                    except BrokenProcessPool:
+                        suspects.append(task)
+                if suspects:
+                    log.warning(f"A worker process died; rerunning {len(suspects)} PDFs one at a time",
+                                extra={"suspects": len(suspects)})
+                executor.shutdown(wait=False)
+                executor = _new_executor(workers, pipeline_options, use_cache)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def collect_inputs(inputs: Iterable[str], manifest: str = None) -> List[Tuple[Path, Path]]:
+    """Expand files, directories, glob patterns and a manifest into (pdf, relative output) pairs.
+
+    The relative output path keeps a PDF's location within a directory input, so
+    files with the same name in different subdirectories don't collide.
+    """
+    inputs = list(inputs)
+    if manifest:
+        with open(manifest, encoding='utf-8') as f:
+            inputs.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+    found = {}
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            for pdf_path in sorted(path.rglob("*")):
+                if pdf_path.is_file() and pdf_path.suffix.lower() == '.pdf':
+                    found.setdefault(pdf_path.resolve(), pdf_path.relative_to(path))
+        elif path.is_file():
+            found.setdefault(path.resolve(), Path(path.name))
+        else:
+            matches = [
+                match for match in sorted(glob.glob(entry, recursive=True))
+                if match.lower().endswith('.pdf') and os.path.isfile(match)
+            ]
+            if not matches:
+                log.warning("No PDFs found", extra={"entry": entry})
+            for match in matches:
+                found.setdefault(Path(match).resolve(), Path(Path(match).name))
+
+    return list(found.items())
+
+
+def options_fingerprint(pipeline_options: PdfPipelineOptions, stream: bool, compact: bool) -> str:
+    """Hash of the options an output is made with, to tell whether a rerun would make it differently."""
+    digest = hashlib.sha256(pipeline_options.model_dump_json().encode())
+    digest.update(f"stream={stream},compact={compact}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_progress(progress_path: Path, field: str = "pdf") -> Dict[str, Dict[str, Any]]:
+    """Latest record for each PDF (or other field) in a progress manifest."""
+    progress = {}
+    if progress_path.exists():
+        with open(progress_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+                progress[record[field]] = record
+    return progress
+
+
+def run_batch(inputs: Iterable[str], output_dir: str = None, recipe: str = "default",
+              workers: int = None, manifest: str = None, progress_path: str = None,
+              stream: bool = False, use_cache: bool = True,
+              pipeline_options: PdfPipelineOptions = None, compact: bool = False,
+              store: str = None) -> Dict[str, Any]:
+    """Convert many PDFs in parallel and return throughput statistics.
+
+    Every PDF is converted with the same pipeline options, by default the recipe's.
+    Outputs go under output_dir (or next to each PDF). Every finished file is
+    appended to a progress manifest; rerunning the same batch skips files whose
+    output is still there, made by the same recipe version with the same options,
+    so an interrupted run picks up where it stopped.
+    With store, a document store directory, each docling document is also kept
+    there, named after the PDF's path relative to its input.
+    """
+    workers = workers or os.cpu_count() or 1
+    if pipeline_options is None:
+        pipeline_options = build_pipeline_options(**registry.get_recipe(recipe).pipeline_defaults)
+    version = type(registry.get_recipe(recipe)).output_version()
+    options = options_fingerprint(pipeline_options, stream, compact)
+    suffix = '.ndjson' if stream else '.json'
+
+    if progress_path is None:
+        progress_path = os.path.join(output_dir, "progress.jsonl") if output_dir else "unpdf-progress.jsonl"
+    progress_path = Path(progress_path)
+    progress_path.parent.mkdir(parents=True, exist_ok=True)
+    progress = load_progress(progress_path)
+
+    pending = []
+    skipped = 0
+    for pdf_path, relative_path in collect_inputs(inputs, manifest):
+        if output_dir:
+            output_path = Path(output_dir) / relative_path.with_suffix(suffix)
+        else:
+            output_path = pdf_path.with_suffix(suffix)
+
+        previous = progress.get(str(pdf_path))
+        if (previous and previous["status"] == "done" and previous.get("recipe") == recipe
+                and previous.get("version") == version and previous.get("options") == options
+                and previous["output"] == str(output_path) and output_path.exists()):
+            skipped += 1
+            continue
+        pending.append((pdf_path, output_path, relative_path))
+
+    log.info(f"Converting {len(pending)} PDFs with {workers} workers ({skipped} already done)",
+             extra={"pending": len(pending), "workers": workers, "skipped": skipped, "recipe": recipe})
+
+    stats = {"converted": 0, "failed": 0, "skipped": skipped, "pages": 0}
+    start = time.perf_counter()
+
+    if pending:
+        tasks = [
+            ((pdf_path, output_path),
+             (str(pdf_path), str(output_path), recipe, stream, use_cache, pipeline_options, compact, store,
+              relative_path.with_suffix("").as_posix()))
+            for pdf_path, output_path, relative_path in pending
+        ]
+        with open(progress_path, 'a', encoding='utf-8') as progress_file:
+            results = _run_surviving_crashes(tasks, min(workers, len(pending)), pipeline_options, use_cache)
+            for (pdf_path, output_path), result in results:
+                record = {"pdf": str(pdf_path), "output": str(output_path), "recipe": recipe,
+                          "version": version, "options": options, **result}
+                progress_file.write(json.dumps(record) + "\n")
+                progress_file.flush()
+
+                done = stats["converted"] + stats["failed"] + 1
+                if record["status"] == "done":
+                    stats["converted"] += 1
+                    stats["pages"] += record["pages"]
+                    log.info(f"[{done}/{len(pending)}] {pdf_path}: {record['pages']} pages in {record['seconds']}s",
+                             extra={"pdf": str(pdf_path), "pages": record["pages"], "seconds": record["seconds"]})
+                else:
+                    stats["failed"] += 1
+                    log.error(f"[{done}/{len(pending)}] {pdf_path}: FAILED {record['error']}",
+                              extra={"pdf": str(pdf_path), "error": record["error"]})
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_second"] = round(stats["converted"] / elapsed, 3) if elapsed else 0.0
+    stats["pages_per_second"] = round(stats["pages"] / elapsed, 3) if elapsed else 0.0
+    return stats
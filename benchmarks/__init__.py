@@ -0,0 +1,3 @@
+"""
+Benchmarks for PDF conversion, run from the repository root with `python -m benchmarks.<name>`.
+"""
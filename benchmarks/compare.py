@@ -0,0 +1,60 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Exits with status 1 if any measurement got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any],
+            threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """Per-measurement changes in seconds (lower is better) between two runs."""
+    rows = []
+    for name, old in baseline["results"].items():
+        new = candidate["results"].get(name)
+        if new is None or not old.get("seconds") or new.get("seconds") is None:
+            continue
+
+        change = new["seconds"] / old["seconds"] - 1
+        if change > threshold:
+            verdict = "REGRESSION"
+        elif change < -threshold:
+            verdict = "improved"
+        else:
+            verdict = ""
+        rows.append({
+            "name": name,
+            "baseline": old["seconds"],
+            "candidate": new["seconds"],
+            "change": change,
+            "verdict": verdict,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline", help="Results from the reference run")
+    parser.add_argument("candidate", help="Results from the run being checked")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown treated as a regression (default: 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        print(f"{row['name']:40} {row['baseline']:>10.4f}s {row['candidate']:>10.4f}s "
+              f"{row['change']:>+8.1%} {row['verdict']}")
+
+    regressions = [row for row in rows if row["verdict"] == "REGRESSION"]
+    print(f"{len(rows)} measurements compared, {len(regressions)} regressions")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,132 @@
+"""
+Fetch a generated PDF from a local stand-in HTTP server, checking conditional requests.
+
+    python -m benchmarks.fetch --pages 20 --repeat 5
+
+The server answers with an ETag and Last-Modified, and with 304 Not Modified when
+a request carries a matching validator. The fetcher's first download, its
+revalidations and a download of a changed PDF are timed, and the answers checked:
+an unchanged PDF is not downloaded again, a changed one is, and a PDF over the
+size limit is refused. Exits with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.synthetic import generate_pdf
+from cache import ConversionCache
+from fetcher import PdfFetcher, PdfTooLargeError
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Serves the server's current PDF at any path, honouring If-None-Match."""
+
+    def do_GET(self):
+        pdf = self.server.pdf
+        etag = f'"{hashlib.sha256(pdf).hexdigest()[:16]}"'
+        self.server.requests += 1
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.server.bodies += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(pdf)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(self.server.modified, usegmt=True))
+        self.end_headers()
+        self.wfile.write(pdf)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def _run(url: str, server: ThreadingHTTPServer, changed_pdf: bytes, repeat: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient() as client:
+        fetcher = PdfFetcher(client, digest=ConversionCache.pdf_digest, max_bytes=len(server.pdf) * 2)
+
+        start = time.perf_counter()
+        content, digest = await fetcher.fetch(url)
+        first_seconds = time.perf_counter() - start
+
+        revalidations = []
+        unchanged = True
+        for _ in range(repeat):
+            start = time.perf_counter()
+            again, again_digest = await fetcher.fetch(url)
+            revalidations.append(time.perf_counter() - start)
+            unchanged = unchanged and again is None and again_digest == digest
+        refetched, _ = await fetcher.fetch(url, revalidate=False)
+
+        server.pdf, server.modified = changed_pdf, server.modified + 60
+        changed, changed_digest = await fetcher.fetch(url)
+
+        small = PdfFetcher(client, digest=ConversionCache.pdf_digest, max_bytes=len(changed_pdf) - 1)
+        try:
+            await small.fetch(url)
+            refused = False
+        except PdfTooLargeError:
+            refused = True
+
+    return {
+        "pdf_bytes": len(content),
+        "first_fetch_seconds": round(first_seconds, 6),
+        "revalidate_seconds": round(statistics.median(revalidations), 6),
+        "requests": server.requests,
+        "bodies_sent": server.bodies,
+        "checks": {
+            "first_fetch_has_body": content is not None and digest == ConversionCache.pdf_digest(content),
+            "unchanged_not_downloaded": unchanged,
+            "revalidate_false_downloads": refetched == content,
+            "changed_downloaded": changed == changed_pdf and changed_digest != digest,
+            "over_limit_refused": refused,
+        },
+    }
+
+
+def run(pages: int, repeat: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(generate_pdf(os.path.join(tmp_dir, "original.pdf"), pages=pages), 'rb') as f:
+            original = f.read()
+        with open(generate_pdf(os.path.join(tmp_dir, "changed.pdf"), pages=pages, seed=1), 'rb') as f:
+            changed = f.read()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    server.pdf, server.modified, server.requests, server.bodies = original, time.time(), 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/document.pdf"
+        return asyncio.run(_run(url, server, changed, repeat))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the generated PDF")
+    parser.add_argument("--repeat", type=int, default=5, help="Revalidations to time")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.pages, args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if all(results["checks"].values()) else 1)
@@ -0,0 +1,147 @@
+"""
+Load test /convert/upload with concurrent clients against a locally started API server.
+
+    python -m benchmarks.http_load --pages 20 --clients 8 --requests 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.synthetic import generate_pdf
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int = None, timeout: float = 600, cold_start: bool = False) -> tuple:
+    """Start the API in a subprocess and wait until /health answers. Returns (process, base URL)."""
+    port = _free_port()
+    env = dict(os.environ)
+    if workers:
+        env["UNPDF_WORKERS"] = str(workers)
+    env["UNPDF_COLD_START"] = "1" if cold_start else "0"
+    # Cached documents would turn the load test into a cache benchmark
+    env["UNPDF_CACHE_MEMORY_ITEMS"] = "0"
+    env["UNPDF_CACHE_MAX_BYTES"] = "0"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError("API server did not become healthy in time")
+
+
+def wait_until_ready(base_url: str, timeout: float = 600) -> None:
+    """Wait until /ready reports that every worker has loaded its models."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("API server did not become ready in time")
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _load(base_url: str, pdf_path: str, clients: int, requests: int,
+                recipe: str) -> Dict[str, Any]:
+    with open(pdf_path, 'rb') as f:
+        content = f.read()
+
+    latencies = []
+    statuses: Dict[int, int] = {}
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client_loop(client: httpx.AsyncClient):
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(
+                f"{base_url}/convert/upload",
+                params={"recipe": recipe},
+                files={"file": ("benchmark.pdf", content, "application/pdf")},
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": requests,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 3),
+        "latency_p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+        "latency_p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+        "latency_mean": round(statistics.mean(latencies), 3) if latencies else None,
+    }
+
+
+def run_load(pdf_path: str, clients: int = 8, requests: int = 32, recipe: str = "default",
+             workers: int = None, base_url: str = None) -> Dict[str, Any]:
+    """Post the PDF requests times from concurrent clients, starting a server unless base_url is given."""
+    process = None
+    if base_url is None:
+        process, base_url = start_server(workers)
+    try:
+        return asyncio.run(_load(base_url, pdf_path, clients, requests, recipe))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the generated PDF")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=32, help="Total requests")
+    parser.add_argument("--recipe", default="default", help="Recipe to request")
+    parser.add_argument("--workers", type=int, help="UNPDF_WORKERS for the started server")
+    parser.add_argument("--url", help="Test an already running server instead of starting one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "benchmark.pdf"), pages=args.pages)
+        results = run_load(pdf_path, args.clients, args.requests, args.recipe,
+                           args.workers, args.url)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,65 @@
+"""
+Compare worker memory with spawned workers against workers forked from a warmed parent.
+
+    python -m benchmarks.memory --workers 4 --pages 10
+
+Each worker converts a generated PDF, then its PSS and USS are read from
+/proc/<pid>/smaps_rollup (Linux only). With pre-forking the model weights are
+shared, so the per-worker USS should drop by roughly the size of the models.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from typing import Any, Dict
+
+from benchmarks.synthetic import generate_pdf
+from metrics import memory_usage
+from workers import ConversionPool
+
+
+async def _convert_on_every_worker(pool: ConversionPool, pdf_path: str) -> None:
+    await asyncio.gather(*(pool.convert_document(pdf_path) for _ in range(pool.workers)))
+
+
+def measure(prefork: bool, workers: int, pdf_path: str) -> Dict[str, Any]:
+    """Per-worker memory after each worker has converted the PDF."""
+    pool = ConversionPool(workers=workers, prefork=prefork)
+    pool.start()
+    try:
+        asyncio.run(_convert_on_every_worker(pool, pdf_path))
+        per_worker = pool.worker_memory()
+        parent = memory_usage()
+    finally:
+        pool.shutdown()
+
+    mib = 1024 ** 2
+    return {
+        "workers": {str(pid): {kind: round(value / mib, 1) for kind, value in memory.items()}
+                    for pid, memory in per_worker.items()},
+        "total_worker_pss_mib": round(sum(m["pss"] for m in per_worker.values()) / mib, 1),
+        "total_worker_uss_mib": round(sum(m["uss"] for m in per_worker.values()) / mib, 1),
+        "parent_pss_mib": round(parent["pss"] / mib, 1) if parent else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--pages", type=int, default=10, help="Pages in the generated PDF")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "benchmark.pdf"), pages=args.pages)
+        # Pre-forking loads the models into this process, so measure spawning first
+        results = {
+            "spawn": measure(False, args.workers, pdf_path),
+            "prefork": measure(True, args.workers, pdf_path),
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,166 @@
+"""
+Time each stage of a conversion on generated PDFs and write the results as JSON.
+
+    python -m benchmarks.run --pages 10,100 --output results.json
+    python -m benchmarks.run --pages 20 --http --output results.json
+    python -m benchmarks.run --pages 10 --startup --output results.json
+    python -m benchmarks.run --pages 50 --table-structure on,auto --output results.json
+
+Stages are timed separately: docling conversion, each recipe's simplify_document,
+and JSON encoding in both the CLI (indented) and API (compact) styles. Each recipe
+is also timed in compact mode (columnar tables), with its minified JSON encoding. With --http,
+/convert/upload is also load tested, and with --startup the CLI and API startup
+times are measured too. With --table-structure, docling is timed in each given
+table-structure mode, reporting pages per second. Compare two result files with
+`python -m benchmarks.compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib.metadata import version
+from typing import Any, Callable, Dict, List
+
+from benchmarks import startup as startup_benchmark
+from benchmarks.http_load import run_load
+from benchmarks.synthetic import generate_pdf
+from converter import build_converter, build_pipeline_options, warm_up
+from recipes.registry import registry
+from sharding import page_count
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Run fn repeat times and summarise the wall-clock timings."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {
+        "seconds": round(statistics.median(runs), 6),
+        "min_seconds": round(min(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+    }
+
+
+def run(page_counts: List[int], repeat: int = 3, docling_repeat: int = 1,
+        http: bool = False, clients: int = 8, requests: int = 16,
+        startup: bool = False, table_structures: List[str] = ("on",)) -> Dict[str, Any]:
+    """Benchmark every stage on a generated PDF of each size, keyed by stage and size.
+
+    Docling is timed once per table-structure mode; the recipes run on the output
+    of the first.
+    """
+    results = {}
+    if startup:
+        results.update(startup_benchmark.run(repeat))
+    converters = {}
+    for mode in table_structures:
+        converters[mode] = build_converter(build_pipeline_options(table_structure=mode))
+        warm_up(converters[mode])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pages in page_counts:
+            pdf_path = generate_pdf(os.path.join(tmp_dir, f"benchmark-{pages}.pdf"), pages=pages)
+            size = f"pages_{pages}"
+            actual_pages = page_count(pdf_path)
+
+            documents = {}
+            for mode, converter in converters.items():
+                def convert():
+                    documents[mode] = converter.convert(pdf_path).document
+
+                timing = measure(convert, docling_repeat)
+                name = f"docling.{size}" if mode == "on" else f"docling.table_{mode}.{size}"
+                results[name] = {**timing, "pages": actual_pages,
+                                 "pages_per_second": round(actual_pages / timing["seconds"], 3)}
+            document = documents[table_structures[0]]
+
+            for recipe_name in registry.list_recipes():
+                recipe = registry.get_recipe(recipe_name)
+                results[f"recipe.{recipe_name}.{size}"] = measure(
+                    lambda: recipe.simplify_document(document), repeat
+                )
+
+                simplified = recipe.simplify_document(document)
+                results[f"json_cli.{recipe_name}.{size}"] = {
+                    **measure(lambda: json.dumps(simplified, ensure_ascii=False, indent=2), repeat),
+                    "bytes": len(json.dumps(simplified, ensure_ascii=False, indent=2).encode()),
+                }
+                # The separators Starlette's JSONResponse uses
+                results[f"json_api.{recipe_name}.{size}"] = {
+                    **measure(lambda: json.dumps(simplified, ensure_ascii=False,
+                                                 separators=(",", ":")), repeat),
+                    "bytes": len(json.dumps(simplified, ensure_ascii=False,
+                                            separators=(",", ":")).encode()),
+                }
+
+                compact_recipe = registry.get_recipe(recipe_name, compact=True)
+                results[f"recipe_compact.{recipe_name}.{size}"] = measure(
+                    lambda: compact_recipe.simplify_document(document), repeat
+                )
+                compact = compact_recipe.simplify_document(document)
+                results[f"json_compact.{recipe_name}.{size}"] = {
+                    **measure(lambda: json.dumps(compact, ensure_ascii=False,
+                                                 separators=(",", ":")), repeat),
+                    "bytes": len(json.dumps(compact, ensure_ascii=False,
+                                            separators=(",", ":")).encode()),
+                }
+
+            if http:
+                load = run_load(pdf_path, clients=clients, requests=requests)
+                results[f"http_upload.{size}"] = {**load, "seconds": load["latency_p50"]}
+
+    return results
+
+
+def metadata() -> Dict[str, Any]:
+    """Describe the machine and versions, so runs are only compared like for like."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "docling": version("docling"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", default="10,50",
+                        help="Comma-separated page counts of the generated PDFs")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per recipe and JSON measurement")
+    parser.add_argument("--docling-repeat", type=int, default=1,
+                        help="Runs per docling conversion")
+    parser.add_argument("--http", action="store_true",
+                        help="Also load test /convert/upload on a locally started server")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument("--requests", type=int, default=16, help="HTTP requests per PDF size")
+    parser.add_argument("--startup", action="store_true",
+                        help="Also time CLI and API startup")
+    parser.add_argument("--table-structure", default="on",
+                        help="Comma-separated table-structure modes to time docling in (on, auto, off)")
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="Where to write the results")
+    args = parser.parse_args()
+
+    page_counts = [int(pages) for pages in args.pages.split(",")]
+    report = {
+        "meta": metadata(),
+        "results": run(page_counts, args.repeat, args.docling_repeat,
+                       args.http, args.clients, args.requests, args.startup,
+                       args.table_structure.split(",")),
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report["results"].items():
+        if result["seconds"] is not None:
+            print(f"{name:40} {result['seconds']:>10.4f}s")
+    print(f"Results written to {args.output}")
@@ -0,0 +1,69 @@
+"""
+Compare converting one large PDF whole against converting it in page-range shards.
+
+    python -m benchmarks.sharding --pages 300 --shard-pages 25 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_pdf
+from recipes.registry import registry
+from sharding import page_count
+from workers import ConversionPool
+
+
+async def _time_conversion(pool: ConversionPool, pdf_path: str, shard_pages: int = None):
+    start = time.perf_counter()
+    document = await pool.convert_document(pdf_path, shard_pages=shard_pages)
+    return document, time.perf_counter() - start
+
+
+def run(pages: int, shard_pages: int, workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "benchmark.pdf"), pages=pages)
+        actual_pages = page_count(pdf_path)
+
+        # Worker startup and model warmup are excluded from the timings
+        pool = ConversionPool(workers=workers)
+        pool.start()
+        try:
+            whole, whole_seconds = asyncio.run(_time_conversion(pool, pdf_path))
+            sharded, sharded_seconds = asyncio.run(_time_conversion(pool, pdf_path, shard_pages))
+        finally:
+            pool.shutdown()
+
+    recipe = registry.get_recipe("frc")
+    whole_output = recipe.simplify_document(whole)
+    sharded_output = recipe.simplify_document(sharded)
+
+    return {
+        "pages": actual_pages,
+        "shard_pages": shard_pages,
+        "workers": pool.workers,
+        "whole_seconds": round(whole_seconds, 3),
+        "sharded_seconds": round(sharded_seconds, 3),
+        "whole_pages_per_second": round(actual_pages / whole_seconds, 2),
+        "sharded_pages_per_second": round(actual_pages / sharded_seconds, 2),
+        "speedup": round(whole_seconds / sharded_seconds, 2),
+        "same_output": whole_output == sharded_output,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300, help="Pages in the generated PDF")
+    parser.add_argument("--shard-pages", type=int, default=25, help="Pages per shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPU cores)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.pages, args.shard_pages, args.workers)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
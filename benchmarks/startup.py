@@ -0,0 +1,79 @@
+"""
+Time how long the CLI and the API take to start.
+
+    python -m benchmarks.startup --repeat 3 --workers 2
+
+The CLI is timed running --help and listing recipes, which should not load the
+models. The API is timed from launch until /health answers and until /ready
+reports every worker has loaded its models, with and without UNPDF_COLD_START.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.http_load import start_server, wait_until_ready
+
+
+def _time_command(args: list, repeat: int) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, capture_output=True)
+        runs.append(time.perf_counter() - start)
+    return _summarise(runs)
+
+
+def _time_server(cold_start: bool, workers: int, repeat: int) -> Dict[str, Dict[str, Any]]:
+    health_runs, ready_runs = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process, base_url = start_server(workers, cold_start=cold_start)
+        try:
+            health_runs.append(time.perf_counter() - start)
+            wait_until_ready(base_url)
+            ready_runs.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+    return {"health": _summarise(health_runs), "ready": _summarise(ready_runs)}
+
+
+def _summarise(runs: list) -> Dict[str, Any]:
+    ordered = sorted(runs)
+    return {
+        "seconds": round(ordered[len(ordered) // 2], 3),
+        "min_seconds": round(ordered[0], 3),
+        "runs": [round(run, 3) for run in runs],
+    }
+
+
+def run(repeat: int = 3, workers: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Startup timings, keyed like benchmarks.run results so they can be compared."""
+    results = {
+        "startup.cli_help": _time_command(["unpdf.py", "--help"], repeat),
+        "startup.list_recipes": _time_command(
+            ["-c", "from recipes.registry import registry; registry.list_recipes()"], repeat
+        ),
+    }
+    for mode, cold_start in (("warm", False), ("cold", True)):
+        timings = _time_server(cold_start, workers, repeat)
+        results[f"startup.api_{mode}.health"] = timings["health"]
+        results[f"startup.api_{mode}.ready"] = timings["ready"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Starts of each entry point")
+    parser.add_argument("--workers", type=int, default=1, help="UNPDF_WORKERS for the API")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.workers)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,71 @@
+"""
+Synthetic PDFs of controllable size, shaped like the FRC and Amnesty documents unPDF handles.
+"""
+import random
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+STANDARDS = ["IAS", "IFRS", "FRS"]
+
+WORDS = (
+    "entity shall recognise impairment loss carrying amount asset recoverable "
+    "cash generating unit disclosure financial statements fair value period "
+    "reporting measurement liability revenue contract lease amendment"
+).split()
+
+
+def _sentence(rnd: random.Random, words: int) -> str:
+    text = " ".join(rnd.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _table(rnd: random.Random, rows: int) -> Table:
+    header = ["Year", "Revenue", "Cost of sales", "Gross profit"]
+    data = [header] + [
+        [str(2000 + i), f"{rnd.randint(100, 9999):,}", f"{rnd.randint(100, 9999):,}", f"{rnd.randint(-999, 9999):,}"]
+        for i in range(rows)
+    ]
+    # repeatRows makes a table that flows over a page break start with its header again,
+    # which is what the recipes' table merging looks for
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ]))
+    return table
+
+
+def generate_pdf(path: str, pages: int = 50, seed: int = 0,
+                 table_rows: int = 60, list_item_words: int = 80) -> str:
+    """Write a PDF of roughly the given number of pages and return its path.
+
+    Each page-sized chunk has a standard heading (e.g. "IAS 36"), subsection headings,
+    numbered paragraphs, long list items and, every few pages, a table long enough
+    to continue onto the next page.
+    """
+    rnd = random.Random(seed)
+    styles = getSampleStyleSheet()
+    story = []
+    paragraph_number = 1
+
+    for page in range(pages):
+        if page % 5 == 0:
+            story.append(Paragraph(f"{rnd.choice(STANDARDS)} {rnd.randint(1, 41)} {_sentence(rnd, 3)}", styles["Heading1"]))
+        story.append(Paragraph(f"Scope and definitions {page + 1}", styles["Heading2"]))
+
+        for _ in range(3):
+            story.append(Paragraph(f"{paragraph_number} {_sentence(rnd, 40)}", styles["BodyText"]))
+            paragraph_number += 1
+        for marker in "abc":
+            story.append(Paragraph(f"({marker}) {_sentence(rnd, list_item_words)}", styles["BodyText"]))
+
+        if page % 4 == 3:
+            story.append(Spacer(1, 12))
+            story.append(_table(rnd, table_rows))
+        story.append(PageBreak())
+
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+    return path
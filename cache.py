@@ -0,0 +1,184 @@
+"""
+Content-addressed cache of docling documents, so repeat conversions skip the models.
+
+Documents are keyed on a digest of the PDF bytes, the pipeline options, the page
+range converted (if not the whole PDF) and the docling version.
+The cache holds the docling output rather than recipe output, so switching recipe
+only re-runs simplify_document.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling_core.types.doc import DoclingDocument
+
+from metrics import cache_lookups
+
+# Default location shared by the CLI and the API
+CACHE_DIR = os.environ.get("UNPDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "unpdf-cache"))
+
+
+class ConversionCache:
+    """Two-tier LRU cache: recent documents in memory, more on disk."""
+
+    def __init__(self, directory: str = None, memory_items: int = None, max_disk_bytes: int = None):
+        if memory_items is None:
+            memory_items = int(os.environ.get("UNPDF_CACHE_MEMORY_ITEMS", "16"))
+        if max_disk_bytes is None:
+            max_disk_bytes = int(os.environ.get("UNPDF_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = Path(directory or CACHE_DIR)
+        self._memory: OrderedDict[str, DoclingDocument] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.max_disk_bytes:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(path.stat().st_size for path in self.directory.glob("*.json.gz"))
+
+    @staticmethod
+    def pdf_digest(pdf: Union[str, bytes]) -> str:
+        """SHA-256 of a PDF, given as a path or its bytes."""
+        digest = hashlib.sha256()
+        if isinstance(pdf, bytes):
+            digest.update(pdf)
+        else:
+            with open(pdf, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(pdf_digest: str, pipeline_options: PdfPipelineOptions,
+                 pages: Tuple[int, int] = None) -> str:
+        """SHA-256 of a PDF's digest, pipeline options, page range and the docling version."""
+        digest = hashlib.sha256()
+        digest.update(pdf_digest.encode())
+        digest.update(pipeline_options.model_dump_json().encode())
+        if pages is not None:
+            digest.update(f"pages={pages[0]}-{pages[1]}".encode())
+        digest.update(version("docling").encode())
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def _remember(self, key: str, document: DoclingDocument) -> None:
+        """Add a document to the memory tier, evicting the least recently used."""
+        if not self.memory_items:
+            return
+        with self._lock:
+            self._memory[key] = document
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[DoclingDocument]:
+        """Look up a document, checking memory first and then disk."""
+        with self._lock:
+            document = self._memory.get(key)
+            if document is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                cache_lookups.inc(result="memory_hits")
+                return document
+
+        path = self._disk_path(key)
+        if self.max_disk_bytes and path.exists():
+            try:
+                with gzip.open(path, 'rb') as f:
+                    document = DoclingDocument.model_validate_json(f.read())
+            except (OSError, ValueError):
+                # Corrupt or half-evicted entry: treat as a miss
+                document = None
+
+        if document is None:
+            with self._lock:
+                self.misses += 1
+                cache_lookups.inc(result="misses")
+            return None
+
+        # Touch the file so disk eviction is least-recently-used too
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted since it was read
+            pass
+        with self._lock:
+            self.disk_hits += 1
+            cache_lookups.inc(result="disk_hits")
+        self._remember(key, document)
+        return document
+
+    def put(self, key: str, document: DoclingDocument) -> None:
+        """Store a document in both tiers."""
+        self._remember(key, document)
+        if not self.max_disk_bytes:
+            return
+
+        path = self._disk_path(key)
+        # Write then rename, so concurrent readers never see a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, 'wb', compresslevel=3) as f:
+            f.write(document.model_dump_json().encode())
+        size = tmp_path.stat().st_size
+        # Under the lock, so puts of the same key count the file they replace once
+        with self._lock:
+            try:
+                previous_size = path.stat().st_size
+            except FileNotFoundError:
+                previous_size = 0
+            os.replace(tmp_path, path)
+            self._disk_bytes += size - previous_size
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used files until the disk tier fits its budget."""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        entries = []
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counters plus current tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else None,
+                "memory_items": len(self._memory),
+                "memory_capacity": self.memory_items,
+                "disk_bytes": self._disk_bytes,
+                "disk_capacity_bytes": self.max_disk_bytes,
+            }
@@ -0,0 +1,130 @@
+"""
+Docling converter construction shared by the CLI, the API and its workers.
+
+docling.document_converter pulls in torch and the model stack, so it is only
+imported when a converter is built, not when this module is.
+"""
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+from docling.datamodel.base_models import DocumentStream, InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+
+if TYPE_CHECKING:
+    from docling.document_converter import DocumentConverter
+
+# "on" runs table-structure inference on every table the layout model finds,
+# "auto" only where the text layer looks like a table, "off" never
+TABLE_STRUCTURE_MODES = ("on", "auto", "off")
+TABLE_MODES = tuple(mode.value for mode in TableFormerMode)
+
+
+class UnpdfPipelineOptions(PdfPipelineOptions):
+    """Docling's PDF pipeline options plus unpdf's adaptive table-structure mode."""
+
+    adaptive_table_structure: bool = False
+
+
+def build_pipeline_options(table_structure: str = "on", table_mode: str = "fast",
+                           ocr: bool = False) -> UnpdfPipelineOptions:
+    """Pipeline options for a table-structure mode, TableFormer mode and OCR setting."""
+    if table_structure not in TABLE_STRUCTURE_MODES:
+        raise ValueError(f"Unknown table structure mode: {table_structure}")
+    if table_mode not in TABLE_MODES:
+        raise ValueError(f"Unknown table mode: {table_mode}")
+
+    pipeline_options = UnpdfPipelineOptions()
+    pipeline_options.do_ocr = ocr
+    pipeline_options.do_table_structure = table_structure != "off"
+    pipeline_options.adaptive_table_structure = table_structure == "auto"
+    pipeline_options.table_structure_options.mode = TableFormerMode(table_mode)
+    return pipeline_options
+
+
+def default_pipeline_options() -> UnpdfPipelineOptions:
+    """Pipeline options used when neither a recipe nor a request asks for others."""
+    return build_pipeline_options()
+
+
+def build_converter(pipeline_options: PdfPipelineOptions = None) -> "DocumentConverter":
+    """Create a PDF-only DocumentConverter."""
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    from docling.pipeline.standard_pdf_pipeline import StandardPdfPipeline
+
+    if pipeline_options is None:
+        pipeline_options = default_pipeline_options()
+
+    pipeline_cls = StandardPdfPipeline
+    if getattr(pipeline_options, "adaptive_table_structure", False):
+        from adaptive_tables import AdaptivePdfPipeline
+        pipeline_cls = AdaptivePdfPipeline
+
+    return DocumentConverter(
+        allowed_formats=[InputFormat.PDF],
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_cls=pipeline_cls,
+                pipeline_options=pipeline_options,
+            ),
+        },
+    )
+
+
+def warm_up(converter: "DocumentConverter") -> None:
+    """Load the models by converting a one-line sample PDF."""
+    from reportlab.pdfgen import canvas
+
+    # Generated in memory, so concurrent workers don't touch the disk
+    sample = BytesIO()
+    c = canvas.Canvas(sample)
+    c.drawString(100, 750, "Warmup document")
+    c.save()
+    converter.convert(DocumentStream(name="warmup.pdf", stream=BytesIO(sample.getvalue())))
+
+
+class ConverterPool:
+    """Converters keyed by pipeline options, each built and warmed the first time it is asked for.
+
+    Every converter loads its own copy of the models, so at most max_size are
+    kept: building another drops the least recently used, freeing its models.
+    """
+
+    def __init__(self, max_size: int = None):
+        if max_size is None:
+            max_size = int(os.environ.get("UNPDF_MAX_CONVERTERS", "2"))
+        self.max_size = max(1, max_size)
+        self._converters: OrderedDict[str, "DocumentConverter"] = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._converters)
+
+    def __contains__(self, pipeline_options: PdfPipelineOptions) -> bool:
+        return pipeline_options.model_dump_json() in self._converters
+
+    def get(self, pipeline_options: PdfPipelineOptions = None) -> "DocumentConverter":
+        """The converter for the pipeline options, building and warming it if there isn't one yet."""
+        if pipeline_options is None:
+            pipeline_options = default_pipeline_options()
+        key = pipeline_options.model_dump_json()
+
+        with self._lock:
+            converter = self._converters.get(key)
+            if converter is not None:
+                self._converters.move_to_end(key)
+                return converter
+
+            converter = build_converter(pipeline_options)
+            # Only kept once its models have loaded, so a failed warmup is retried next time
+            warm_up(converter)
+            self._converters[key] = converter
+            self.builds += 1
+            while len(self._converters) > self.max_size:
+                self._converters.popitem(last=False)
+                self.evictions += 1
+            return converter
@@ -0,0 +1,141 @@
+"""
+Download PDFs over a shared, connection-pooled HTTP client.
+
+Each response's ETag and Last-Modified headers are remembered along with the
+digest of its PDF. Fetching the same URL again sends a conditional request, and
+when the server answers 304 Not Modified the caller gets the digest back instead
+of a body, so an unchanged PDF already in the conversion cache is neither
+downloaded nor converted.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FetchError(Exception):
+    """Raised when a PDF cannot be downloaded."""
+
+
+class PdfTooLargeError(Exception):
+    """Raised when a PDF is over the size limit."""
+
+
+async def read_limited(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """Collect a PDF as it arrives, failing as soon as it exceeds max_bytes."""
+    parts = []
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise PdfTooLargeError(f"PDF is larger than the {max_bytes} byte limit")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+def build_client() -> httpx.AsyncClient:
+    """HTTP client with pooled connections, timeouts and connection retries."""
+    timeout = float(os.environ.get("UNPDF_FETCH_TIMEOUT", "60"))
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=10),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        transport=httpx.AsyncHTTPTransport(retries=int(os.environ.get("UNPDF_FETCH_RETRIES", "2"))),
+    )
+
+
+class PdfFetcher:
+    """Fetches PDFs with per-host concurrency limits and conditional requests."""
+
+    def __init__(self, client: httpx.AsyncClient, digest: Callable[[bytes], str], max_bytes: int,
+                 per_host: int = None, remembered_urls: int = None):
+        if per_host is None:
+            per_host = int(os.environ.get("UNPDF_FETCH_PER_HOST", "4"))
+        if remembered_urls is None:
+            remembered_urls = int(os.environ.get("UNPDF_FETCH_REMEMBERED_URLS", "1024"))
+
+        self.client = client
+        self.digest = digest
+        self.max_bytes = max_bytes
+        self.per_host = per_host
+        self.remembered_urls = remembered_urls
+        # Semaphores of the hosts being downloaded from, and how many downloads hold or wait on each
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self._validators: OrderedDict[str, Dict[str, str]] = OrderedDict()
+
+    @asynccontextmanager
+    async def _host_limit(self, url: str) -> AsyncIterator[None]:
+        """Hold one of the URL's host's download slots, forgetting the host once no download needs it."""
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+            self._host_users[host] = 0
+        self._host_users[host] += 1
+        try:
+            async with self._host_limits[host]:
+                yield
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_limits[host], self._host_users[host]
+
+    def _remember(self, url: str, response: httpx.Response, digest: str) -> None:
+        """Keep a response's validators, evicting the least recently fetched URL."""
+        validators = {"digest": digest}
+        if "etag" in response.headers:
+            validators["etag"] = response.headers["etag"]
+        if "last-modified" in response.headers:
+            validators["last_modified"] = response.headers["last-modified"]
+        if len(validators) == 1:
+            # Nothing to revalidate against
+            self._validators.pop(url, None)
+            return
+
+        self._validators[url] = validators
+        self._validators.move_to_end(url)
+        while len(self._validators) > self.remembered_urls:
+            self._validators.popitem(last=False)
+
+    async def fetch(self, url: str, revalidate: bool = True) -> Tuple[Optional[bytes], str]:
+        """Download a PDF, returning its bytes and digest.
+
+        With revalidate set and the URL fetched before, the request is conditional;
+        if the PDF has not changed the bytes are None and the digest is the one
+        remembered from the earlier download.
+        """
+        headers = {}
+        validators = self._validators.get(url) if revalidate else None
+        if validators:
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        async with self._host_limit(url):
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and validators:
+                        self._validators.move_to_end(url)
+                        return None, validators["digest"]
+                    if response.status_code != 200:
+                        raise FetchError(f"Failed to download PDF: HTTP {response.status_code}")
+
+                    content_length = response.headers.get("content-length")
+                    if content_length and not content_length.strip().isdigit():
+                        raise FetchError(f"Failed to download PDF: invalid Content-Length {content_length!r}")
+                    if content_length and int(content_length) > self.max_bytes:
+                        raise PdfTooLargeError(f"PDF is larger than the {self.max_bytes} byte limit")
+
+                    content = await read_limited(response.aiter_bytes(CHUNK_SIZE), self.max_bytes)
+            except httpx.HTTPError as e:
+                raise FetchError(f"Failed to download PDF: {e}")
+
+        digest = await asyncio.to_thread(self.digest, content)
+        self._remember(url, response, digest)
+        return content, digest
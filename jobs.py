@@ -0,0 +1,286 @@
+"""
+Background conversion jobs: submit a PDF, poll its status, fetch the result later.
+
+The job store is blocking (SQLite and files), so the scheduler calls it from
+worker threads, keeping the event loop free while results are written.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from logs import get_logger
+from workers import ConversionPool
+
+log = get_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobStore(ABC):
+    """Storage for job records, their input PDFs and their results."""
+
+    @abstractmethod
+    def create(self, job: Dict[str, Any]) -> None:
+        """Save a new job record."""
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job record, or None if it does not exist."""
+        pass
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """Update fields of a job record."""
+        pass
+
+    @abstractmethod
+    def input_path(self, job_id: str) -> str:
+        """Path where the job's input PDF is kept until it has been converted."""
+        pass
+
+    @abstractmethod
+    def save_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Save the simplified document produced by a job."""
+        pass
+
+    @abstractmethod
+    def load_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Load a job's result, or None if there is none."""
+        pass
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """Remove a job record along with its input and result."""
+        pass
+
+    @abstractmethod
+    def finished_before(self, timestamp: float) -> List[str]:
+        """IDs of jobs that finished before the given time."""
+        pass
+
+    @abstractmethod
+    def unfinished(self) -> List[str]:
+        """IDs of jobs that are still queued or running."""
+        pass
+
+
+class SqliteJobStore(JobStore):
+    """Job records in SQLite, PDFs and results as files alongside the database.
+
+    Safe to use from several threads: they take turns on the one connection.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.directory / "jobs.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                recipe TEXT NOT NULL,
+                source TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        self._db.commit()
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.directory / job_id
+
+    def create(self, job: Dict[str, Any]) -> None:
+        self._job_dir(job["id"]).mkdir(exist_ok=True)
+        columns = ", ".join(job)
+        placeholders = ", ".join("?" for _ in job)
+        with self._lock:
+            self._db.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", list(job.values()))
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+            self._db.commit()
+
+    def input_path(self, job_id: str) -> str:
+        return str(self._job_dir(job_id) / "input.pdf")
+
+    def save_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        with open(self._job_dir(job_id) / "result.json", 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+
+    def load_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        result_path = self._job_dir(job_id) / "result.json"
+        if not result_path.exists():
+            return None
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def delete(self, job_id: str) -> None:
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db.commit()
+
+    def finished_before(self, timestamp: float) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (timestamp,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class JobScheduler:
+    """Runs submitted jobs on the conversion pool and evicts old results."""
+
+    def __init__(self, pool: ConversionPool, store: JobStore, ttl: float = None):
+        self.pool = pool
+        self.store = store
+        self.ttl = ttl if ttl is not None else float(os.environ.get("UNPDF_JOB_TTL", "3600"))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Jobs wait here rather than in the pool backlog, which they skip, so they
+        # never fail because HTTP requests have filled it
+        self._slots = asyncio.Semaphore(pool.workers)
+        self._evictor = None
+
+    def start(self) -> None:
+        """Fail jobs left over from a previous run and start evicting expired ones."""
+        for job_id in self.store.unfinished():
+            self.store.update(job_id, status=FAILED, error="Interrupted by server restart",
+                              finished_at=time.time())
+        if self.ttl:
+            self._evictor = asyncio.create_task(self._evict_periodically())
+
+    async def stop(self) -> None:
+        """Cancel running jobs and the eviction task."""
+        tasks = list(self._tasks.values())
+        if self._evictor:
+            tasks.append(self._evictor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def create_job(self, recipe: str, source: str = None) -> Dict[str, Any]:
+        """Create a queued job record. Its input PDF goes to store.input_path(job["id"])."""
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "recipe": recipe,
+            "source": source,
+            "created_at": time.time(),
+        }
+        await asyncio.to_thread(self.store.create, job)
+        return job
+
+    def submit(self, job_id: str, fetch: Callable[[str], Awaitable[None]] = None) -> None:
+        """Schedule a created job, optionally fetching its input PDF first."""
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, fetch))
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it has already finished.
+
+        A conversion already running on a worker cannot be interrupted; it runs to
+        completion and its result is discarded.
+        """
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        # A task cancelled before it first ran never got to record anything
+        if self._tasks.pop(job_id, None) is not None:
+            await asyncio.to_thread(self.store.update, job_id, status=CANCELLED, finished_at=time.time())
+            input_path = self.store.input_path(job_id)
+            if os.path.exists(input_path):
+                os.unlink(input_path)
+        return True
+
+    async def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record with timing information."""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+
+        now = time.time()
+        started_at = job.get("started_at")
+        finished_at = job.get("finished_at")
+        job["timing"] = {
+            "queued_seconds": round((started_at or finished_at or now) - job["created_at"], 3),
+            "running_seconds": round((finished_at or now) - started_at, 3) if started_at else None,
+        }
+        if finished_at and self.ttl:
+            job["expires_at"] = finished_at + self.ttl
+        return job
+
+    async def _run(self, job_id: str, fetch: Callable[[str], Awaitable[None]] = None) -> None:
+        """Fetch, queue and convert a single job, recording each transition."""
+        input_path = self.store.input_path(job_id)
+        try:
+            if fetch is not None:
+                await fetch(input_path)
+
+            async with self._slots:
+                await asyncio.to_thread(self.store.update, job_id, status=RUNNING, started_at=time.time())
+                job = await asyncio.to_thread(self.store.get, job_id)
+                result = await self.pool.convert(input_path, job["recipe"], check_backlog=False)
+
+            await asyncio.to_thread(self.store.save_result, job_id, result)
+            await asyncio.to_thread(self.store.update, job_id, status=COMPLETED, finished_at=time.time())
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.store.update, job_id, status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            log.warning(f"Job {job_id} failed: {e}", extra={"job_id": job_id})
+            await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e),
+                                    finished_at=time.time())
+        finally:
+            self._tasks.pop(job_id, None)
+            if os.path.exists(input_path):
+                os.unlink(input_path)
+
+    def evict_expired(self) -> int:
+        """Delete jobs that finished more than ttl seconds ago. A ttl of 0 keeps them forever."""
+        expired = self.store.finished_before(time.time() - self.ttl)
+        for job_id in expired:
+            self.store.delete(job_id)
+        return len(expired)
+
+    async def _evict_periodically(self) -> None:
+        interval = max(1.0, min(self.ttl / 4, 300.0))
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.evict_expired)
@@ -0,0 +1,205 @@
+"""
+Structured logging, written from a background thread.
+
+Every module logs through get_logger(__name__), a logger under "unpdf". Records
+are put on a queue and a listener thread formats and writes them to stderr, so
+a slow log pipe never holds up the code logging. Each record carries the id of
+the request it was logged for (see request_context()) and the fields passed as
+extra, written as key=value text or, with UNPDF_LOG_FORMAT=json, one JSON object
+per line.
+
+UNPDF_LOG_LEVEL is the level, and can set other levels per logger, e.g.
+"INFO,unpdf.recipes=DEBUG" to trace what the recipes do with each item. Debug
+records are sampled by request: UNPDF_LOG_SAMPLE is the share of requests whose
+debug records are kept (default 1). Hot paths check tracing() once, so debug
+records cost nothing when they would be dropped.
+"""
+import contextvars
+import json
+import logging
+import multiprocessing.util
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator, Optional
+
+LOG_LEVEL = os.environ.get("UNPDF_LOG_LEVEL", "INFO")
+
+# "text" or "json"
+LOG_FORMAT = os.environ.get("UNPDF_LOG_FORMAT", "text")
+
+# Share of requests whose debug records are kept
+LOG_SAMPLE = float(os.environ.get("UNPDF_LOG_SAMPLE", "1"))
+
+ROOT = "unpdf"
+
+# Id of the request being handled, attached to every record logged for it
+request_id: contextvars.ContextVar = contextvars.ContextVar("unpdf_request_id", default=None)
+
+# LogRecord attributes, as opposed to fields passed as extra
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_configured_pid: Optional[int] = None
+_sample = LOG_SAMPLE
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module, e.g. get_logger(__name__) in recipes/engine.py is unpdf.recipes.engine."""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+@contextmanager
+def request_context(value: str = None) -> Iterator[str]:
+    """Attach a request id, a new one unless given, to everything logged inside the block."""
+    token = request_id.set(value or uuid.uuid4().hex[:16])
+    try:
+        yield request_id.get()
+    finally:
+        request_id.reset(token)
+
+
+def sampled(value: Optional[str]) -> bool:
+    """Whether debug records are kept for a request id, the same for all of one request's records."""
+    if _sample >= 1:
+        return True
+    if value is None:
+        return random.random() < _sample
+    return zlib.crc32(value.encode()) % 10000 < _sample * 10000
+
+
+def tracing(logger: logging.Logger) -> bool:
+    """Whether a logger's debug records would be written for the current request.
+
+    Hot paths call this once, e.g. per document, and only log debug records if it is true.
+    """
+    return logger.isEnabledFor(logging.DEBUG) and sampled(request_id.get())
+
+
+class _SampleFilter(logging.Filter):
+    """Drops the debug records of requests left out of the sample."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs before the record is queued, in the thread that logged it
+        return record.levelno > logging.DEBUG or sampled(request_id.get())
+
+
+class _RequestQueueHandler(QueueHandler):
+    """Queues records as they are, leaving the formatting to the listener's thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener's thread doesn't know which request a record was logged for
+        record.request_id = request_id.get()
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats a record and its extra fields as key=value text or as JSON."""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            fields["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                # Extra fields never replace the record's own
+                fields.setdefault(key, value)
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        if self.json_lines:
+            return json.dumps(fields, ensure_ascii=False, default=str)
+
+        text = " ".join([fields.pop("time"), fields.pop("level"), fields.pop("logger"), fields.pop("message")])
+        exception = fields.pop("exception", None)
+        text += "".join(f" {key}={json.dumps(value, ensure_ascii=False, default=str)}"
+                        for key, value in fields.items())
+        return f"{text}\n{exception}" if exception else text
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """Levels by logger name from e.g. "INFO,unpdf.recipes=DEBUG"; the bare level is the root's."""
+    result = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = part.rpartition("=")
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level: {level}")
+        result[name.strip() or ROOT] = value
+    return result
+
+
+def set_levels(spec: str) -> Dict[str, str]:
+    """Change log levels while running, as UNPDF_LOG_LEVEL sets them, and return them all."""
+    for name, level in parse_levels(spec).items():
+        logging.getLogger(name).setLevel(level)
+    return levels()
+
+
+def levels() -> Dict[str, str]:
+    """Level of the root logger and of every unpdf logger given one."""
+    result = {ROOT: logging.getLevelName(logging.getLogger(ROOT).getEffectiveLevel())}
+    for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+        if name.startswith(ROOT + ".") and isinstance(logger, logging.Logger) and logger.level:
+            result[name] = logging.getLevelName(logger.level)
+    return result
+
+
+def configure_logging(level: str = None, log_format: str = None, sample: float = None,
+                      stream=None) -> None:
+    """Send the unpdf loggers' records through a queue to stderr.
+
+    Calling it again in the same process does nothing; a process forked from
+    one that called it, whose listener thread didn't survive the fork, sets up
+    its own.
+    """
+    global _listener, _configured_pid, _sample
+    if _configured_pid == os.getpid():
+        return
+    level_spec = level or LOG_LEVEL
+    parse_levels(level_spec)
+
+    root = logging.getLogger(ROOT)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_lines=(log_format or LOG_FORMAT) == "json"))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _RequestQueueHandler(records)
+    queue_handler.addFilter(_SampleFilter())
+    root.addHandler(queue_handler)
+    # Written here, not also by the application's root logger
+    root.propagate = False
+
+    _sample = LOG_SAMPLE if sample is None else sample
+    set_levels(level_spec)
+
+    # Run at exit, including by worker processes, which skip atexit when forked
+    multiprocessing.util.Finalize(None, _stop_listener, exitpriority=-100)
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    _configured_pid = os.getpid()
+
+
+def _stop_listener() -> None:
+    """Write out what is still queued before the process exits."""
+    global _listener
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,315 @@
+"""
+Per-stage timers and Prometheus-style metrics for conversions.
+
+Stages are timed with the stage() context manager. Every timing feeds the
+unpdf_stage_seconds histogram; inside record_stages() it is also collected into
+a per-request breakdown, optionally with cProfile output, for the profile flag.
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import resource
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    """Base class for metrics rendered in the Prometheus text format."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """The sample lines for this metric."""
+        pass
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            for key, value in self._values.items():
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self) -> None:
+        """Forget every labelled value, e.g. for processes that have gone."""
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            for key, value in self._values.items():
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    yield f"{self.name}_bucket{labels} {cumulative}"
+                labels = _format_labels(self.labelnames, key)
+                yield f"{self.name}_sum{labels} {self._sums[key]}"
+                yield f"{self.name}_count{labels} {cumulative}"
+
+
+_registry: List[Metric] = []
+
+stage_seconds = Histogram(
+    "unpdf_stage_seconds", "Time spent in each conversion stage", labelnames=("stage",)
+)
+document_pages = Histogram(
+    "unpdf_document_pages", "Pages per converted document",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+pages_total = Counter("unpdf_pages_total", "Pages converted by docling")
+worker_peak_rss = Histogram(
+    "unpdf_worker_peak_rss_bytes", "Peak RSS of the worker process after each conversion",
+    buckets=tuple(2 ** power * 1024 ** 2 for power in range(6, 16)),
+)
+process_peak_rss = Gauge("unpdf_process_peak_rss_bytes", "Peak RSS of the API process")
+pending_conversions = Gauge("unpdf_pending_conversions", "Conversions running or waiting for a worker")
+cache_lookups = Counter(
+    "unpdf_cache_lookups_total", "Conversion cache lookups since startup, by result", labelnames=("result",)
+)
+workers_recycled = Counter(
+    "unpdf_workers_recycled_total", "Worker processes replaced since startup, after a conversion limit, a stopped conversion or a crash"
+)
+limit_errors = Counter(
+    "unpdf_conversion_limit_errors_total", "Conversions refused or stopped by a limit: pages, memory or timeout",
+    labelnames=("limit",),
+)
+converter_builds = Counter(
+    "unpdf_converter_builds_total", "Converters built and warmed by the workers, one per pipeline configuration"
+)
+converter_evictions = Counter(
+    "unpdf_converter_evictions_total", "Converters dropped by the workers to make room for another configuration"
+)
+worker_memory = Gauge(
+    "unpdf_worker_memory_bytes",
+    "Memory of each worker process: rss, pss (shared pages split between processes) and uss (unique)",
+    labelnames=("pid", "kind"),
+)
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes(pid: int = None) -> Optional[int]:
+    """Resident set size of a process now, by default this one.
+
+    Read from /proc/<pid>/statm, which is cheap even for a large process. Where it
+    is unavailable this process's peak is returned instead, or None for another process.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes() if pid is None else None
+
+
+def memory_usage(pid: int = None) -> Optional[Dict[str, int]]:
+    """RSS, PSS and USS of a process in bytes, or None where /proc/<pid>/smaps_rollup is unavailable.
+
+    USS counts only the pages no other process shares; PSS adds an equal share of
+    each shared page, so copy-on-write model memory shows up as a lower PSS and USS.
+    The kernel walks every mapping of the process to work these out, which takes a
+    while for a process holding the models, so call it off the event loop.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    fields = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        parts = value.split()
+        if len(parts) == 2 and parts[1] == "kB":
+            fields[name] = int(parts[0]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    process_peak_rss.set(peak_rss_bytes())
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class StageRecorder:
+    """Per-request breakdown of stage timings."""
+
+    def __init__(self, cprofile: bool = False):
+        self.cprofile = cprofile
+        self.stages: Dict[str, float] = {}
+        self.profiles: Dict[str, str] = {}
+        self.info: Dict[str, Any] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            **self.info,
+        }
+        if self.cprofile:
+            result["cprofile"] = self.profiles
+        return result
+
+
+_recorder: contextvars.ContextVar = contextvars.ContextVar("unpdf_stage_recorder", default=None)
+_active_stages: contextvars.ContextVar = contextvars.ContextVar("unpdf_active_stages", default=frozenset())
+
+
+@contextmanager
+def record_stages(cprofile: bool = False) -> Iterator[StageRecorder]:
+    """Collect the stages timed within this block (and tasks or threads it starts)."""
+    recorder = StageRecorder(cprofile)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def current_recorder() -> StageRecorder:
+    """The recorder for the current request, if any."""
+    return _recorder.get()
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage timed elsewhere, e.g. inside a worker process."""
+    stage_seconds.observe(seconds, stage=name)
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+def format_profile(profiler: cProfile.Profile, limit: int = 30) -> str:
+    """The most expensive calls by cumulative time, as text."""
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+@contextmanager
+def stage(name: str, profile: bool = False) -> Iterator[None]:
+    """Time a stage. Nested use of the same stage is only counted once.
+
+    With profile set, synchronous code in the block is also run under cProfile
+    when the current request asked for it.
+    """
+    active = _active_stages.get()
+    if name in active:
+        yield
+        return
+
+    recorder = _recorder.get()
+    profiler = None
+    if profile and recorder is not None and recorder.cprofile:
+        profiler = cProfile.Profile()
+
+    token = _active_stages.set(active | {name})
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            recorder.profiles[name] = format_profile(profiler)
+        _active_stages.reset(token)
+        observe_stage(name, time.perf_counter() - start)
@@ -1,19 +1,106 @@
+import functools
+import hashlib
+import sys
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Collection, Dict, Iterator, Set
 
 from docling.datamodel.document import DsDocument
 
+from metrics import stage
+
+
+def imported_modules(module: ModuleType, packages: Collection[str]) -> Set[str]:
+    """Names of the modules of the given packages that a module imports, or imports from."""
+    names = set()
+    for value in vars(module).values():
+        name = value.__name__ if isinstance(value, ModuleType) else getattr(value, "__module__", None)
+        if isinstance(name, str) and name.partition(".")[0] in packages and name != module.__name__:
+            names.add(name)
+    return names
+
 
 class ConversionRecipe(ABC):
     """Base class for document conversion recipes."""
     
+    # Keyword arguments for converter.build_pipeline_options, e.g. {"table_structure": "auto"},
+    # which requests can override
+    pipeline_defaults: Dict[str, Any] = {}
+    
+    # Part of output_version(); bump it when the output changes for a reason outside
+    # the recipe's own package, e.g. a docling-core upgrade
+    version = "1"
+    
+    def __init__(self, compact: bool = False):
+        """With compact set, output uses the recipe's compact encodings, such as columnar tables."""
+        self.compact = compact
+    
+    def __init_subclass__(cls, **kwargs):
+        """Time every recipe's simplify_document as the "recipe" stage."""
+        super().__init_subclass__(**kwargs)
+        if "simplify_document" in cls.__dict__:
+            simplify_document = cls.__dict__["simplify_document"]
+
+            @functools.wraps(simplify_document)
+            def timed_simplify_document(self, doc):
+                with stage("recipe", profile=True):
+                    return simplify_document(self, doc)
+
+            cls.simplify_document = timed_simplify_document
+    
     @abstractmethod
     def simplify_document(self, doc: DsDocument) -> Dict[str, Any]:
         """Convert a Docling document to simplified format using recipe-specific logic."""
         pass
 
+    def iter_sections(self, doc: DsDocument) -> Iterator[Dict[str, Any]]:
+        """Yield the top-level sections of the simplified document one at a time.
+
+        Recipes that can produce sections incrementally should override this so
+        streaming output does not hold the whole document in memory.
+        """
+        yield from self.simplify_document(doc)["document"]
+
     @classmethod
     def get_name(cls) -> str:
         """Get the recipe name. Defaults to lowercase class name without 'Recipe' suffix."""
         name = cls.__name__.lower()
-        return name[:-6] if name.endswith('recipe') else name 
\ No newline at end of file
+        return name[:-6] if name.endswith('recipe') else name
+
+    @classmethod
+    def source_modules(cls) -> Dict[str, ModuleType]:
+        """Modules the recipe runs: those of its package (and of this one) that its
+        classes are defined in, or that those modules import from."""
+        # Recipes from outside this package, e.g. plugins, also cover the base classes they build on
+        packages = {cls.__module__.partition(".")[0], __name__.partition(".")[0]}
+
+        modules = {}
+        pending = [klass.__module__ for klass in cls.__mro__
+                   if klass.__module__.partition(".")[0] in packages]
+        while pending:
+            name = pending.pop()
+            module = sys.modules.get(name)
+            if name in modules or module is None:
+                continue
+            modules[name] = module
+            pending.extend(imported_modules(module, packages))
+        return modules
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def output_version(cls) -> str:
+        """Identify the output the recipe produces: its version and the source it runs.
+
+        The source is that of its source_modules(), so editing a shared helper
+        changes the version of every recipe that uses it. It is hashed once per
+        class, as loaded; a reloaded recipe is a new class.
+        """
+        modules = cls.source_modules()
+        digest = hashlib.sha256(cls.version.encode())
+        for name in sorted(modules):
+            source = getattr(modules[name], "__file__", None)
+            if source:
+                digest.update(name.encode())
+                digest.update(Path(source).read_bytes())
+        return digest.hexdigest()[:16]
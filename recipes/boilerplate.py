@@ -0,0 +1,101 @@
+"""
+Page furniture detection: text repeated in the page margins across many pages.
+
+Running headers and footers, page numbers and address lines sit at the top or
+bottom of the page and repeat, with small changes such as the page number, on
+page after page. One pass over a document's text counts, for each line in a
+margin, how many pages it appears on. Lines are compared by a hash of their text
+normalised (case folded, whitespace collapsed, digits replaced) together with
+the margin they are in.
+
+Counting uses the Misra-Gries heavy-hitters summary, so memory is bounded by the
+number of counters rather than by the length of the document. A count can fall
+short by at most the number of margin lines divided by the number of counters;
+with a few margin lines per page, that is a handful of pages even for a
+thousand-page document.
+"""
+import math
+import re
+from typing import Dict, List, Optional, Set
+
+from docling_core.types.doc import CoordOrigin, DoclingDocument
+
+_DIGITS = re.compile(r"\d+")
+
+# Share of the page height at the top and bottom treated as margins
+MARGIN = 0.08
+
+# Counters kept while counting; bounds memory whatever the document's length
+COUNTERS = 1024
+
+
+def normalise(text: str) -> str:
+    """Text as compared across pages: case folded, whitespace collapsed, numbers replaced with #."""
+    return _DIGITS.sub("#", " ".join(text.split()).casefold())
+
+
+def margin_key(item, doc: DoclingDocument, margin: float = MARGIN) -> Optional[int]:
+    """Hash of a text item's normalised text and the margin it is in, or None if it isn't in one."""
+    text = getattr(item, "text", None)
+    if not text or not item.prov:
+        return None
+    prov = item.prov[0]
+    page = doc.pages.get(prov.page_no)
+    if page is None or not page.size.height:
+        return None
+    # Distance of the box's middle from the top of the page, as a share of its height
+    bbox = prov.bbox
+    middle = (bbox.t + bbox.b) / 2 / page.size.height
+    if bbox.coord_origin == CoordOrigin.BOTTOMLEFT:
+        middle = 1 - middle
+    if middle < margin:
+        zone = "top"
+    elif middle > 1 - margin:
+        zone = "bottom"
+    else:
+        return None
+    normalised = normalise(text)
+    return hash((zone, normalised)) if normalised else None
+
+
+class PageFrequency:
+    """Misra-Gries summary of how many pages each key appears on."""
+
+    def __init__(self, counters: int = COUNTERS):
+        self.counters = counters
+        # key -> [pages counted, last page counted on]
+        self._counts: Dict[int, List[int]] = {}
+
+    def add(self, key: int, page_no: int) -> None:
+        """Count a key on a page, once however often it appears there."""
+        entry = self._counts.get(key)
+        if entry is not None:
+            if entry[1] != page_no:
+                entry[0] += 1
+                entry[1] = page_no
+            return
+        if len(self._counts) < self.counters:
+            self._counts[key] = [1, page_no]
+            return
+        # Full: the new key and every tracked one lose a count. Total decrements
+        # never exceed total counts, so this stays linear overall.
+        for tracked in list(self._counts):
+            entry = self._counts[tracked]
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self._counts[tracked]
+
+    def frequent(self, min_pages: int) -> Set[int]:
+        """Keys counted on at least min_pages pages."""
+        return {key for key, (pages, _) in self._counts.items() if pages >= min_pages}
+
+
+def find_furniture(doc: DoclingDocument, min_share: float, min_pages: int,
+                   margin: float = MARGIN, counters: int = COUNTERS) -> Set[int]:
+    """Margin keys of the text repeated on at least min_share of the pages, and min_pages of them."""
+    frequency = PageFrequency(counters)
+    for item in doc.texts:
+        key = margin_key(item, doc, margin)
+        if key is not None:
+            frequency.add(key, item.prov[0].page_no)
+    return frequency.frequent(max(min_pages, math.ceil(min_share * len(doc.pages))))
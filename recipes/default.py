@@ -1,15 +1,18 @@
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
+
+from logs import get_logger, tracing
 
 from .frc import FrcRecipe
 
+log = get_logger(__name__)
+
 
 class DefaultRecipe(FrcRecipe):
     """Default conversion recipe that inherits FRC document processing behavior."""
     
     def clean_title(self, title: str) -> str:
         """Clean up section titles by removing LaTeX-style artifacts and extra whitespace."""
-        # Add debug print
-        print(f"Cleaning title: {title}")
+        original = title
         
         # Remove LaTeX math mode markers and empty superscripts
         title = title.replace("$^{ }$", "")
@@ -20,24 +23,17 @@ class DefaultRecipe(FrcRecipe):
         # Clean up extra whitespace
         title = " ".join(title.split())
         
-        # Add debug print
-        print(f"Cleaned title: {title}")
+        if title != original and tracing(log):
+            log.debug("Cleaned title", extra={"title": original, "cleaned": title})
         
         return title
 
-    def simplify_document(self, doc) -> Dict[str, List[Dict[str, Any]]]:
-        """Override to clean section titles during document processing."""
-        result = super().simplify_document(doc)
-        
-        # Clean titles in all sections
-        for section in result["document"]:
-            if "title" in section:
-                section["title"] = self.clean_title(section["title"])
-            
-            # Also clean subsection titles
-            if "subsections" in section:
-                for subsection in section["subsections"]:
-                    if "title" in subsection:
-                        subsection["title"] = self.clean_title(subsection["title"])
-        
-        return result
\ No newline at end of file
+    def item_transforms(self) -> List[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+        """Clean section titles during document processing."""
+        return [*super().item_transforms(), self.clean_section_title]
+
+    def clean_section_title(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Clean the title of a section item."""
+        if item["type"] == "section":
+            item["title"] = self.clean_title(item["title"])
+        return item
@@ -0,0 +1,186 @@
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from logs import get_logger, tracing
+
+from .base import ConversionRecipe
+from .boilerplate import find_furniture, margin_key
+from .matching import Rule, RuleMatcher, compiled_rules
+
+# Turns a docling item into a section or content item, or None to leave it out
+Builder = Callable[[Any], Optional[Dict[str, Any]]]
+Transform = Callable[[Dict[str, Any]], Dict[str, Any]]
+Filter = Callable[[Dict[str, Any]], bool]
+
+log = get_logger(__name__)
+
+# Characters of an item's text included when tracing what happens to it
+TRACE_TEXT = 80
+
+
+def _describe_rule(rule: Rule) -> Dict[str, Any]:
+    """A rule's conditions, for tracing."""
+    return {name: value for name, value in rule._asdict().items() if value is not None}
+
+
+class HookRecipe(ConversionRecipe):
+    """Base class for recipes built from per-item hooks.
+
+    Subclasses extend the hook lists (calling super()) rather than re-walking the
+    output: the hooks are composed once per recipe instance and every docling item
+    passes through all of them in a single pass, however deep the inheritance.
+
+    Content rules drop or keep items by their stripped text. They are data, so a
+    subclass adds to them with content_rules = (*Parent.content_rules, ...); they
+    are compiled once per class and the first match decides, before any filter.
+    """
+
+    content_rules: Tuple[Rule, ...] = ()
+
+    # Drop page furniture: text repeated in the page margins on at least this share
+    # of the pages (and boilerplate_min_pages of them), found by counting every
+    # margin line's pages in one pass over the converted document, at the start of
+    # the recipe pass and before any sections are built
+    remove_boilerplate = False
+    boilerplate_min_share = 0.3
+    boilerplate_min_pages = 3
+
+    def item_builders(self) -> Dict[type, Builder]:
+        """Map docling item classes to functions building their output entries."""
+        return {}
+
+    def item_transforms(self) -> List[Transform]:
+        """Functions applied in turn to every section and content item."""
+        return []
+
+    def item_filters(self) -> List[Filter]:
+        """Predicates marking content items to drop."""
+        return []
+
+    def infer_section_level(self, title: str, prev_title: str = None) -> int:
+        """Classify a section as main (1) or subsection (2) from its raw title."""
+        return 1
+
+    def append_content(self, content: List[Dict[str, Any]], item: Dict[str, Any]) -> None:
+        """Add a content item to its section."""
+        content.append(item)
+
+    def finish_section(self, section: Dict[str, Any]) -> Dict[str, Any]:
+        """Finalise a main section, subsections included, once nothing more will be added to it."""
+        return section
+
+    def iter_items(self, doc) -> Iterator[Any]:
+        """The docling items to convert, in reading order.
+
+        Items are ordered page by page, and within a page by their position in
+        docling's body tree. Items outside the tree follow the rest of their page.
+        """
+        positions = {}
+        page_no = 0
+        for index, (item, _) in enumerate(doc.iterate_items()):
+            if item.prov:
+                page_no = item.prov[0].page_no
+            positions[item.self_ref] = (page_no, index)
+
+        unplaced = len(positions)
+
+        def position(item) -> Tuple[int, int]:
+            placed = positions.get(item.self_ref)
+            if placed is not None:
+                return placed
+            return (item.prov[0].page_no if item.prov else 0), unplaced
+
+        return iter(sorted([*doc.texts, *doc.tables], key=position))
+
+    @cached_property
+    def _hooks(self) -> Tuple[Dict[type, Builder], List[Transform], List[Filter], RuleMatcher]:
+        return (self.item_builders(), self.item_transforms(), self.item_filters(),
+                compiled_rules(type(self), "content_rules"))
+
+    def iter_sections(self, doc) -> Iterator[Dict[str, Any]]:
+        """Yield finished main sections one at a time, holding only the current one in memory."""
+        builders, transforms, filters, rules = self._hooks
+        # Checked once here, so tracing costs nothing per item unless it is on
+        trace = tracing(log)
+
+        current_main_section = None
+        current_section = None
+        prev_title = None
+
+        def start_section(section: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            """Place a new section in the hierarchy, returning the main section it completes."""
+            nonlocal current_main_section, current_section, prev_title
+            finished = None
+            # Levels are inferred from the raw titles, before any transforms
+            level = self.infer_section_level(section["title"], prev_title)
+            prev_title = section["title"]
+            section["level"] = level
+            for transform in transforms:
+                section = transform(section)
+
+            if level == 1 or current_main_section is None:
+                section["level"] = 1
+                finished = current_main_section
+                current_main_section = section
+                current_main_section["subsections"] = []
+            else:
+                current_main_section["subsections"].append(section)
+            current_section = section
+            if trace:
+                log.debug("Started section", extra={"title": section["title"],
+                                                       "section_level": section["level"]})
+            return finished
+
+        # Content before the first heading goes in an untitled section
+        start_section({"type": "section", "title": "", "content": []})
+
+        # Margin lines are counted over the whole converted document before the first item is built
+        furniture = None
+        if self.remove_boilerplate:
+            furniture = find_furniture(doc, self.boilerplate_min_share, self.boilerplate_min_pages)
+
+        for docling_item in self.iter_items(doc):
+            build = builders.get(type(docling_item))
+            if build is None:
+                continue
+            if furniture and margin_key(docling_item, doc) in furniture:
+                if trace:
+                    log.debug("Dropped page furniture", extra={"text": docling_item.text[:TRACE_TEXT],
+                                                               "page": docling_item.prov[0].page_no})
+                continue
+            item = build(docling_item)
+            if item is None:
+                continue
+
+            if item["type"] == "section":
+                finished = start_section(item)
+                if finished is not None:
+                    yield self.finish_section(finished)
+                continue
+
+            for transform in transforms:
+                item = transform(item)
+            rule = rules.match(item.get("text", "").strip(), item["type"]) if rules.rules else None
+            if rule is not None and rule.action == "drop":
+                if trace:
+                    log.debug("Dropped item by rule", extra={"text": item.get("text", "")[:TRACE_TEXT],
+                                                             "rule": _describe_rule(rule)})
+                continue
+            if rule is None or rule.action != "keep":
+                dropped_by = next((drop for drop in filters if drop(item)), None)
+                if dropped_by is not None:
+                    if trace:
+                        name = getattr(dropped_by, "__name__", repr(dropped_by))
+                        log.debug("Dropped item by filter", extra={"text": item.get("text", "")[:TRACE_TEXT],
+                                                                   "filter": name})
+                    continue
+            elif trace:
+                log.debug("Kept item by rule", extra={"text": item.get("text", "")[:TRACE_TEXT],
+                                                      "rule": _describe_rule(rule)})
+            self.append_content(current_section["content"], item)
+
+        yield self.finish_section(current_main_section)
+
+    def simplify_document(self, doc) -> Dict[str, List[Dict[str, Any]]]:
+        """Convert Docling document to simplified format while preserving structure."""
+        return {"document": list(self.iter_sections(doc))}
@@ -1,206 +1,119 @@
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-from .base import ConversionRecipe
+from docling_core.types.doc.document import ListItem, SectionHeaderItem, TableItem, TextItem
 
+from .engine import HookRecipe
+from .matching import Rule, compiled_rules
+from .tables import TableSegment, chain_table, encode_table, table_header
 
-class FrcRecipe(ConversionRecipe):
+
+class FrcRecipe(HookRecipe):
     """Recipe optimized for Financial Reporting Council (FRC) documents."""
     
+    # Main section headers are typically standard names
+    section_rules = tuple(
+        Rule("main", prefix=prefix, item_type=None)
+        for prefix in ["IAS ", "IFRS ", "FRS ", "UK exit", "Periodic Review", "Effective date"]
+    )
+
     def infer_section_level(self, title: str, prev_title: str = None) -> int:
         """Infer section level based on content and context."""
-        # Main section headers are typically standard names
-        main_headers = [
-            "IAS ",
-            "IFRS ",
-            "FRS ",
-            "UK exit",
-            "Periodic Review",
-            "Effective date"
-        ]
-        
+        sections = compiled_rules(type(self), "section_rules")
+
         # Check if this is a main section
-        if any(title.startswith(prefix) for prefix in main_headers):
+        if sections.classify(title) == "main":
             return 1
-            
+
         # If previous title was a main section (e.g., "IAS 36"),
         # and this title relates to it, it's a subsection
-        if prev_title and any(prev_title.startswith(prefix) for prefix in main_headers):
-            if not any(title.startswith(prefix) for prefix in main_headers):
-                return 2
-                
+        if prev_title and sections.classify(prev_title) == "main":
+            return 2
+
         return 1  # Default level
 
-    def build_section_hierarchy(self, sections: List[Dict]) -> List[Dict]:
-        """Build section hierarchy based on inferred structure."""
-        hierarchy = []
-        current_main_section = None
-        prev_title = None
-        
-        for section in sections:
-            # Infer the true level
-            inferred_level = self.infer_section_level(section["title"], prev_title)
-            section["level"] = inferred_level
-            
-            if inferred_level == 1:
-                # This is a main section
-                current_main_section = section
-                current_main_section["subsections"] = []
-                hierarchy.append(current_main_section)
-            else:
-                # This is a subsection
-                if current_main_section:
-                    current_main_section["subsections"].append(section)
-                else:
-                    # If no main section exists, treat it as a main section
-                    section["level"] = 1
-                    hierarchy.append(section)
-            
-            prev_title = section["title"]
-        
-        return hierarchy
+    def append_content(self, content: List[Dict[str, Any]], item: Dict[str, Any]) -> None:
+        """Add a content item, merging a table into the previous one when it is a continuation."""
+        if item["type"] == "table" and content and content[-1]["type"] == "table":
+            current_table = content[-1]
+            # Compare headers (first row)
+            header = table_header(item)
+            if header is not None and header == table_header(current_table):
+                # Merge tables - skip the header row of the second table
+                chain_table(current_table, item)
+                return
+        content.append(item)
+
+    def finish_section(self, section: Dict[str, Any]) -> Dict[str, Any]:
+        """Encode the tables of a finished section as rows, or columns in compact mode."""
+        for part in (section, *section.get("subsections", [])):
+            for item in part["content"]:
+                if item["type"] == "table":
+                    encode_table(item, self.compact)
+        return section
 
     def merge_consecutive_tables(self, content_items: List[Dict]) -> List[Dict]:
         """Merge consecutive tables that appear to be continuations."""
-        if not content_items:
-            return content_items
-        
         merged_content = []
-        current_table = None
-        
         for item in content_items:
-            if item["type"] == "table":
-                # Check if this could be a continuation of previous table
-                if current_table and item.get("rows") and current_table.get("rows"):
-                    # Compare headers (first row)
-                    current_headers = current_table["rows"][0]
-                    new_headers = item["rows"][0]
-                    
-                    if current_headers == new_headers:
-                        # Merge tables - skip the header row of the second table
-                        current_table["rows"].extend(item["rows"][1:])
-                        continue
-                
-                # Not a continuation or no previous table
-                if current_table:
-                    merged_content.append(current_table)
-                current_table = item
-            else:
-                # Non-table item - add previous table if exists and then this item
-                if current_table:
-                    merged_content.append(current_table)
-                    current_table = None
-                merged_content.append(item)
-        
-        # Add final table if exists
-        if current_table:
-            merged_content.append(current_table)
-        
+            self.append_content(merged_content, item)
         return merged_content
 
-    def simplify_document(self, doc) -> Dict[str, List[Dict[str, Any]]]:
-        """Convert Docling document to simplified format while preserving structure."""
-        sections = []
-        current_section = None
-        
-        # Start with a default section if needed
-        default_section = {
+    def item_builders(self) -> Dict[type, Callable[[Any], Optional[Dict[str, Any]]]]:
+        """Build sections from headers, paragraphs and footnotes from text, numbered items from lists."""
+        return {
+            **super().item_builders(),
+            SectionHeaderItem: self.build_section,
+            TextItem: self.build_text,
+            ListItem: self.build_list_item,
+            TableItem: self.build_table,
+        }
+
+    def build_section(self, header: SectionHeaderItem) -> Dict[str, Any]:
+        """Start a new section."""
+        return {
             "type": "section",
-            "title": "",
-            "content": [],
-            "level": 1
+            "title": header.text,
+            "content": []
+        }
+
+    def build_text(self, text: TextItem) -> Dict[str, Any]:
+        """Handle regular paragraphs and footnotes."""
+        return {
+            "type": "footnote" if text.label == 'footnote' else "paragraph",
+            "text": text.text
         }
-        current_section = default_section
-        sections.append(default_section)
+
+    def build_list_item(self, text: ListItem) -> Dict[str, Any]:
+        """Extract the paragraph number and sub-item marker from a list item."""
+        text_content = text.text
+        paragraph_num = None
+        
+        # Try to extract paragraph number from start of text
+        if text_content and text_content[0].isdigit():
+            parts = text_content.split(' ', 1)
+            if parts[0].isdigit():
+                paragraph_num = int(parts[0])
+                text_content = parts[1] if len(parts) > 1 else ''
         
-        # Process all text items in order
-        for text in doc.texts:
-            item_type = type(text).__name__
-            
-            if item_type == 'SectionHeaderItem':
-                # Start a new section
-                current_section = {
-                    "type": "section",
-                    "title": text.text,
-                    "content": []
-                }
-                sections.append(current_section)
-                
-            elif item_type == 'TextItem':
-                # Handle regular paragraphs and footnotes
-                if text.label == 'footnote':
-                    item = {
-                        "type": "footnote",
-                        "text": text.text
-                    }
-                else:
-                    item = {
-                        "type": "paragraph",
-                        "text": text.text
-                    }
-                if current_section:
-                    current_section["content"].append(item)
-                    
-            elif item_type == 'ListItem':
-                # Extract paragraph number if present
-                text_content = text.text
-                paragraph_num = None
-                
-                # Try to extract paragraph number from start of text
-                if text_content and text_content[0].isdigit():
-                    parts = text_content.split(' ', 1)
-                    if parts[0].isdigit():
-                        paragraph_num = int(parts[0])
-                        text_content = parts[1] if len(parts) > 1 else ''
-                
-                item = {
-                    "type": "paragraph",
-                    "text": text_content,
-                }
-                
-                if paragraph_num is not None:
-                    item["number"] = paragraph_num
-                
-                # Handle sub-items (like (a), (b), etc.)
-                if text.marker and text.marker.startswith('('):
-                    item["type"] = "sub_item"
-                    item["marker"] = text.marker
-                    
-                # Add to current section if exists
-                if current_section:
-                    current_section["content"].append(item)
-
-        # Process tables
-        for table in doc.tables:
-            table_data = {
-                "type": "table",
-                "caption": table.captions[0].cref if table.captions else None,
-                "rows": []
-            }
-            
-            if hasattr(table.data, 'grid'):
-                for row in table.data.grid:
-                    table_row = []
-                    for cell in row:
-                        cell_text = getattr(cell, 'text', '') if cell else ''
-                        table_row.append(cell_text)
-                    table_data["rows"].append(table_row)
-            
-            # Add to current section if exists
-            if current_section:
-                current_section["content"].append(table_data)
+        item = {
+            "type": "paragraph",
+            "text": text_content,
+        }
         
-        # Build hierarchy from collected sections
-        hierarchy = self.build_section_hierarchy(sections)
+        if paragraph_num is not None:
+            item["number"] = paragraph_num
         
-        # Process each section to merge consecutive tables
-        for section in hierarchy:
-            if section.get("content"):
-                section["content"] = self.merge_consecutive_tables(section["content"])
-            
-            # Process subsections
-            if section.get("subsections"):
-                for subsection in section["subsections"]:
-                    if subsection.get("content"):
-                        subsection["content"] = self.merge_consecutive_tables(subsection["content"])
+        # Handle sub-items (like (a), (b), etc.)
+        if text.marker and text.marker.startswith('('):
+            item["type"] = "sub_item"
+            item["marker"] = text.marker
         
-        return {"document": hierarchy} 
\ No newline at end of file
+        return item
+
+    def build_table(self, table: TableItem) -> Dict[str, Any]:
+        """Extract a table's caption reference and cell grid, encoded when its section is finished."""
+        return {
+            "type": "table",
+            "caption": table.captions[0].cref if table.captions else None,
+            "segments": [TableSegment(table.data.grid if hasattr(table.data, 'grid') else [])],
+        }
@@ -0,0 +1,124 @@
+"""
+Declarative text rules for recipes, compiled into one matcher per recipe class.
+
+A recipe lists its rules as data: each Rule names an action and the conditions
+an item's text must meet (prefix, suffix, whole-text regex, length bounds). The
+first matching rule, in declaration order, decides.
+
+Rules are compiled once into a prefix trie, a suffix trie and a single combined
+regex, so matching a text costs one walk from each end plus at most one regex
+search to find the few rules that could apply, however many rules there are.
+"""
+import re
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Set
+
+_END = object()
+
+
+class Rule(NamedTuple):
+    """Conditions on a text that must all hold for the rule to match.
+
+    action is what a match means: "drop" or "keep" for content rules, or a label
+    for classification rules. pattern must match the whole text; digits requires
+    it to be all digits (str.isdigit). Content rules only apply to items of
+    item_type, or to any item if it is None.
+    """
+
+    action: str
+    prefix: Optional[str] = None
+    suffix: Optional[str] = None
+    pattern: Optional[str] = None
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+    digits: bool = False
+    item_type: Optional[str] = "paragraph"
+
+
+def _build_trie(keys: Dict[int, str]) -> Dict[Any, Any]:
+    root: Dict[Any, Any] = {}
+    for index, key in keys.items():
+        node = root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(_END, []).append(index)
+    return root
+
+
+def _walk_trie(root: Dict[Any, Any], chars, hits: Set[int]) -> None:
+    """Add the rules of every key that the characters start with."""
+    node = root
+    for char in chars:
+        node = node.get(char)
+        if node is None:
+            return
+        hits.update(node.get(_END, ()))
+
+
+class RuleMatcher:
+    """Rules compiled for matching in one pass over a text."""
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+        self._patterns = {i: re.compile(rule.pattern) for i, rule in enumerate(self.rules) if rule.pattern}
+
+        prefixes = {i: rule.prefix for i, rule in enumerate(self.rules) if rule.prefix}
+        suffixes = {i: rule.suffix[::-1] for i, rule in enumerate(self.rules)
+                    if rule.suffix and not rule.prefix}
+        self._prefix_trie = _build_trie(prefixes)
+        self._suffix_trie = _build_trie(suffixes)
+
+        # Rules anchored at neither end are candidates for every text; those with a
+        # pattern only when the combined regex of all such patterns matches
+        unanchored = [i for i, rule in enumerate(self.rules) if not rule.prefix and not rule.suffix]
+        self._always = [i for i in unanchored if not self.rules[i].pattern]
+        self._patterned = [i for i in unanchored if self.rules[i].pattern]
+        self._combined = None
+        if self._patterned:
+            self._combined = re.compile("|".join(f"(?:{self.rules[i].pattern})" for i in self._patterned))
+
+    def _matches(self, rule: Rule, index: int, text: str, item_type: Optional[str]) -> bool:
+        if rule.item_type is not None and item_type is not None and rule.item_type != item_type:
+            return False
+        if rule.prefix and not text.startswith(rule.prefix):
+            return False
+        if rule.suffix and not text.endswith(rule.suffix):
+            return False
+        if rule.min_length is not None and len(text) < rule.min_length:
+            return False
+        if rule.max_length is not None and len(text) > rule.max_length:
+            return False
+        if rule.digits and not text.isdigit():
+            return False
+        if rule.pattern and not self._patterns[index].fullmatch(text):
+            return False
+        return True
+
+    def match(self, text: str, item_type: str = None) -> Optional[Rule]:
+        """The first rule the text (of an item of item_type) matches, or None."""
+        candidates = set(self._always)
+        _walk_trie(self._prefix_trie, text, candidates)
+        _walk_trie(self._suffix_trie, reversed(text), candidates)
+        if self._combined is not None and self._combined.fullmatch(text):
+            candidates.update(self._patterned)
+
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            if self._matches(rule, index, text, item_type):
+                return rule
+        return None
+
+    def classify(self, text: str, item_type: str = None) -> Optional[str]:
+        """The action of the first rule the text matches, or None."""
+        rule = self.match(text, item_type)
+        return rule.action if rule is not None else None
+
+
+def compiled_rules(cls: type, attribute: str) -> RuleMatcher:
+    """The matcher for a class's rule list, compiled the first time it is needed."""
+    cache_name = f"_compiled_{attribute}"
+    # Looked up in the class's own namespace, so a subclass never reuses its parent's rules
+    matcher = cls.__dict__.get(cache_name)
+    if matcher is None:
+        matcher = RuleMatcher(getattr(cls, attribute))
+        setattr(cls, cache_name, matcher)
+    return matcher
@@ -1,36 +1,294 @@
-from typing import Dict, Type
+"""
+Recipe registry: finds recipes without importing them, and imports each when first used.
 
-from .amnesty import AmnestyRecipe
-from .base import ConversionRecipe
-from .default import DefaultRecipe
-from .frc import FrcRecipe
+Recipes come from, each taking precedence over the ones before:
+
+- the built-in recipes of this package;
+- entry points of installed packages in the "unpdf.recipes" group, named after
+  the recipe, e.g. ``letters = "inhouse.recipes:LettersRecipe"``;
+- the Python files in UNPDF_RECIPE_DIR, whose classes named ...Recipe (but not
+  _...Recipe) are recipes named as ConversionRecipe.get_name names them;
+- classes passed to RecipeRegistry.register.
+
+Listing and describing recipes reads their source rather than importing it.
+Recipes keep no state besides their options, so one instance of each is shared.
+reload() picks up recipes added or removed since, and re-runs the modules of
+loaded recipes whose source has changed, without touching the converters.
+"""
+import ast
+import importlib
+import importlib.metadata
+import importlib.util
+import os
+import sys
+import threading
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Set, Tuple, Type
+
+from logs import get_logger
+
+if TYPE_CHECKING:
+    from .base import ConversionRecipe
+
+log = get_logger(__name__)
+
+# Entry point group installed packages list their recipes in
+ENTRY_POINT_GROUP = "unpdf.recipes"
+
+# Directory of recipe files to load besides the built-in and installed ones
+RECIPE_DIR = os.environ.get("UNPDF_RECIPE_DIR") or None
+
+# Plugin files are loaded as modules of this name, e.g. recipe_plugins.letters
+PLUGIN_PACKAGE = "recipe_plugins"
+
+BUILTIN_RECIPES = {
+    "default": f"{__package__}.default:DefaultRecipe",
+    "amnesty": f"{__package__}.amnesty:AmnestyRecipe",
+    "frc": f"{__package__}.frc:FrcRecipe",
+}
+
+
+class RecipeSpec(NamedTuple):
+    """Where to find a recipe class: a module and the class's name in it."""
+    name: str
+    module: str
+    attribute: str
+    # Plugin file the module is loaded from, for modules that can't be imported by name
+    path: Optional[str] = None
+
+
+def _source_stamp(module: ModuleType) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a module's source, to tell when it changes."""
+    try:
+        stat = os.stat(module.__file__)
+    except (AttributeError, TypeError, OSError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _class_docstring(path: Optional[str], class_name: str) -> Optional[str]:
+    """Docstring of a class as written in a source file, or None if it can't be read."""
+    try:
+        tree = ast.parse(Path(path).read_bytes())
+    except (TypeError, OSError, SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            return ast.get_docstring(node) or ""
+    return None
+
+
+def _plugin_specs(directory: str, previous: Dict[str, RecipeSpec]) -> List[RecipeSpec]:
+    """Recipes defined in the Python files of a directory, found by parsing them.
+
+    A file that doesn't parse, e.g. while being edited, keeps the recipes it had before.
+    """
+    specs = []
+    for path in sorted(Path(directory).glob("*.py")):
+        if path.name.startswith("_"):
+            continue
+        try:
+            tree = ast.parse(path.read_bytes())
+        except (OSError, SyntaxError, ValueError) as e:
+            log.warning(f"Skipping recipe file {path}: {e}", extra={"path": str(path)})
+            specs.extend(spec for spec in previous.values() if spec.path == str(path))
+            continue
+        for node in tree.body:
+            class_name = node.name if isinstance(node, ast.ClassDef) else ""
+            if class_name.lower().endswith("recipe") and len(class_name) > 6 and not class_name.startswith("_"):
+                specs.append(RecipeSpec(class_name.lower()[:-6], f"{PLUGIN_PACKAGE}.{path.stem}",
+                                        class_name, str(path)))
+    return specs
 
 
 class RecipeRegistry:
-    """Registry for conversion recipes."""
-    
-    def __init__(self):
-        self._recipes: Dict[str, Type[ConversionRecipe]] = {}
-        
-        # Register built-in recipes
-        self.register(DefaultRecipe)
-        self.register(AmnestyRecipe)
-        self.register(FrcRecipe)
-    
-    def register(self, recipe_class: Type[ConversionRecipe]):
-        """Register a new recipe class."""
-        self._recipes[recipe_class.get_name()] = recipe_class
-    
-    def get_recipe(self, name: str = "default") -> ConversionRecipe:
-        """Get a recipe instance by name."""
-        recipe_class = self._recipes.get(name)
-        if recipe_class is None:
-            raise ValueError(f"Unknown recipe: {name}")
-        return recipe_class()
-    
+    """Registry for conversion recipes, importing each when first used."""
+
+    def __init__(self, recipe_dir: str = None):
+        self.recipe_dir = recipe_dir or RECIPE_DIR
+        self._lock = threading.RLock()
+        self._specs: Optional[Dict[str, RecipeSpec]] = None
+        self._registered: Dict[str, Type["ConversionRecipe"]] = {}
+        self._classes: Dict[str, Type["ConversionRecipe"]] = {}
+        self._instances: Dict[Tuple[str, bool], "ConversionRecipe"] = {}
+        # Source stamp of every module loaded recipes run, as it was when run
+        self._loaded: Dict[str, Tuple[int, int]] = {}
+
+    def _discover(self) -> Dict[str, RecipeSpec]:
+        """Find every recipe, without importing any."""
+        specs = {}
+        for name, target in BUILTIN_RECIPES.items():
+            module, _, attribute = target.partition(":")
+            specs[name] = RecipeSpec(name, module, attribute)
+        for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+            specs[entry_point.name] = RecipeSpec(entry_point.name, entry_point.module, entry_point.attr)
+        if self.recipe_dir and os.path.isdir(self.recipe_dir):
+            specs.update((spec.name, spec) for spec in _plugin_specs(self.recipe_dir, self._specs or {}))
+        return specs
+
+    def _get_specs(self) -> Dict[str, RecipeSpec]:
+        with self._lock:
+            if self._specs is None:
+                self._specs = self._discover()
+            return self._specs
+
+    def _load(self, spec: RecipeSpec) -> Type["ConversionRecipe"]:
+        """Import a recipe's module, or run its plugin file, and return the recipe class."""
+        from .base import ConversionRecipe
+
+        if spec.path is None:
+            module = importlib.import_module(spec.module)
+        else:
+            module = sys.modules.get(spec.module)
+            if module is None or getattr(module, "__file__", None) != spec.path:
+                module_spec = importlib.util.spec_from_file_location(spec.module, spec.path)
+                module = importlib.util.module_from_spec(module_spec)
+                sys.modules[spec.module] = module
+                try:
+                    module_spec.loader.exec_module(module)
+                except BaseException:
+                    del sys.modules[spec.module]
+                    raise
+
+        recipe_class = getattr(module, spec.attribute, None)
+        if not (isinstance(recipe_class, type) and issubclass(recipe_class, ConversionRecipe)):
+            raise TypeError(f"{spec.module}:{spec.attribute} is not a conversion recipe")
+        for name, source_module in recipe_class.source_modules().items():
+            self._loaded.setdefault(name, _source_stamp(source_module))
+        return recipe_class
+
+    def register(self, recipe_class: Type["ConversionRecipe"]):
+        """Register a new recipe class, in place of any other recipe of the same name."""
+        with self._lock:
+            name = recipe_class.get_name()
+            self._registered[name] = recipe_class
+            self._classes.pop(name, None)
+            self._instances = {key: value for key, value in self._instances.items() if key[0] != name}
+
+    def get_recipe_class(self, name: str = "default") -> Type["ConversionRecipe"]:
+        """Get a recipe class by name, importing it if it hasn't been yet."""
+        with self._lock:
+            recipe_class = self._registered.get(name) or self._classes.get(name)
+            if recipe_class is None:
+                spec = self._get_specs().get(name)
+                if spec is None:
+                    raise ValueError(f"Unknown recipe: {name}")
+                recipe_class = self._classes[name] = self._load(spec)
+            return recipe_class
+
+    def get_recipe(self, name: str = "default", compact: bool = False) -> "ConversionRecipe":
+        """Get a recipe instance by name, optionally producing compact output.
+
+        Instances are shared by every caller asking for the same recipe and options.
+        """
+        recipe = self._instances.get((name, compact))
+        if recipe is None:
+            with self._lock:
+                recipe = self._instances.get((name, compact))
+                if recipe is None:
+                    recipe = self._instances[(name, compact)] = self.get_recipe_class(name)(compact=compact)
+        return recipe
+
     def list_recipes(self) -> list[str]:
         """List all available recipe names."""
-        return list(self._recipes.keys())
+        with self._lock:
+            return list(dict.fromkeys([*self._get_specs(), *self._registered]))
+
+    def describe(self, name: str) -> str:
+        """A recipe's description, its class's docstring, read from its source if not yet imported."""
+        with self._lock:
+            recipe_class = self._registered.get(name) or self._classes.get(name)
+            if recipe_class is not None:
+                return recipe_class.__doc__ or ""
+            spec = self._get_specs().get(name)
+            if spec is None:
+                raise ValueError(f"Unknown recipe: {name}")
+        path = spec.path
+        if path is None:
+            try:
+                path = importlib.util.find_spec(spec.module).origin
+            except (ImportError, AttributeError, ValueError):
+                path = None
+        docstring = _class_docstring(path, spec.attribute)
+        if docstring is None:
+            # No source to read, e.g. a compiled module
+            return self.get_recipe_class(name).__doc__ or ""
+        return docstring
+
+    def _reload_order(self, changed: Set[str]) -> List[str]:
+        """Changed modules and every loaded one importing them, each after those it imports."""
+        from .base import imported_modules
+
+        packages = {name.partition(".")[0] for name in self._loaded}
+        imports = {
+            name: imported_modules(sys.modules[name], packages) & self._loaded.keys()
+            for name in self._loaded if name in sys.modules
+        }
+        stale = set(changed)
+        while True:
+            dependents = {name for name, names in imports.items() if names & stale} - stale
+            if not dependents:
+                break
+            stale |= dependents
+
+        order: List[str] = []
+        visited: Set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            visited.add(name)
+            for imported in sorted(imports.get(name, set()) & stale):
+                visit(imported)
+            order.append(name)
+
+        for name in sorted(stale):
+            visit(name)
+        return order
+
+    def reload(self) -> List[str]:
+        """Find recipes again and re-run the modules of loaded recipes changed since loaded.
+
+        Returns the names of the recipes replaced. Instances are made afresh when
+        next asked for; documents being simplified meanwhile finish with the
+        recipe they started with. A module that fails to run, e.g. with a syntax
+        error, is tried again on the next reload.
+        """
+        with self._lock:
+            changed = {name for name, stamp in self._loaded.items()
+                       if name not in sys.modules or _source_stamp(sys.modules[name]) != stamp}
+            order = self._reload_order(changed)
+            previous_specs = self._specs or {}
+            rerun = []
+            try:
+                for name in order:
+                    module = sys.modules.get(name)
+                    if module is None or _source_stamp(module) is None:
+                        # Gone, e.g. a deleted plugin file; its recipes go with the specs
+                        self._loaded.pop(name)
+                        sys.modules.pop(name, None)
+                        continue
+                    # Compile before running anything, so a syntax error leaves the module as it was;
+                    # read from source, as a .pyc of a file edited within a second can look current
+                    code = compile(Path(module.__file__).read_bytes(), module.__file__, "exec")
+                    exec(code, vars(module))
+                    self._loaded[name] = _source_stamp(module)
+                    rerun.append(name)
+            finally:
+                self._specs = self._discover()
+                replaced = [name for name, recipe_class in self._classes.items()
+                            if set(recipe_class.source_modules()) & set(order)
+                            or self._specs.get(name) != previous_specs.get(name)]
+                for name in replaced:
+                    del self._classes[name]
+                self._instances = {key: value for key, value in self._instances.items()
+                                   if key[0] in self._classes or key[0] in self._registered}
+
+            log.info(f"Reloaded recipe modules: {', '.join(rerun) or 'none changed'}",
+                     extra={"modules": rerun, "replaced": replaced})
+            return replaced
+
 
 # Global registry instance
-registry = RecipeRegistry() 
\ No newline at end of file
+registry = RecipeRegistry()
@@ -0,0 +1,115 @@
+"""
+Table encodings for recipe output.
+
+While a recipe runs, a table item holds the cell grids docling produced for it as
+segments. A table continued on the next page is chained on as another segment,
+minus its repeated header row, rather than having its rows copied. Once its
+section is finished, each table is encoded in one of two ways:
+
+- rows (the default): a list of rows of cell text, with a spanning cell's text
+  repeated in every position it covers
+- columnar (compact): every distinct cell text once, in "strings", and one list
+  per column of indices into it. A spanning cell is stored once, at its top-left
+  position, and listed in "spans" as [row, column, rows spanned, columns spanned];
+  the other positions it covers are null
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+
+Grid = List[List[Any]]
+
+
+class TableSegment(NamedTuple):
+    """A docling cell grid, from first_row on, making up part of a table."""
+
+    grid: Grid
+    first_row: int = 0
+
+
+def cell_text(cell) -> str:
+    return getattr(cell, 'text', '') if cell else ''
+
+
+def table_header(table: Dict[str, Any]) -> Optional[List[str]]:
+    """Text of a table's first row, or None if it has no rows."""
+    if "rows" in table:
+        return table["rows"][0] if table["rows"] else None
+    segment = table["segments"][0]
+    if len(segment.grid) <= segment.first_row:
+        return None
+    return [cell_text(cell) for cell in segment.grid[segment.first_row]]
+
+
+def chain_table(table: Dict[str, Any], continuation: Dict[str, Any]) -> None:
+    """Add a continuation's rows, apart from its repeated header row, to a table."""
+    if "rows" in table:
+        table["rows"].extend(continuation["rows"][1:])
+        return
+    first, *rest = continuation["segments"]
+    table["segments"].extend([TableSegment(first.grid, first.first_row + 1), *rest])
+
+
+def _rows(segments: List[TableSegment]) -> List[List[str]]:
+    return [
+        [cell_text(cell) for cell in row]
+        for segment in segments
+        for row in segment.grid[segment.first_row:]
+    ]
+
+
+def _columnar(segments: List[TableSegment]) -> Dict[str, Any]:
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        index = string_index.get(text)
+        if index is None:
+            index = string_index[text] = len(strings)
+            strings.append(text)
+        return index
+
+    num_cols = max((len(row) for segment in segments for row in segment.grid[segment.first_row:]),
+                   default=0)
+    columns: List[List[Optional[int]]] = [[] for _ in range(num_cols)]
+    spans = []
+    row_no = 0
+    for segment in segments:
+        for grid_row in range(segment.first_row, len(segment.grid)):
+            row = segment.grid[grid_row]
+            for col in range(num_cols):
+                cell = row[col] if col < len(row) else None
+                if cell is None or not hasattr(cell, 'start_row_offset_idx'):
+                    columns[col].append(intern(cell_text(cell)))
+                else:
+                    # A span reaching up into a skipped header row starts at the segment's first row
+                    start_row = max(cell.start_row_offset_idx, segment.first_row)
+                    if start_row != grid_row or cell.start_col_offset_idx != col:
+                        # Covered by a spanning cell that starts above or to the left
+                        columns[col].append(None)
+                        continue
+                    columns[col].append(intern(cell.text))
+                    row_span = cell.end_row_offset_idx - start_row
+                    col_span = cell.end_col_offset_idx - cell.start_col_offset_idx
+                    if row_span > 1 or col_span > 1:
+                        spans.append([row_no, col, row_span, col_span])
+            row_no += 1
+
+    return {
+        "encoding": "columnar",
+        "num_rows": row_no,
+        "num_cols": num_cols,
+        "strings": strings,
+        "columns": columns,
+        "spans": spans,
+    }
+
+
+def encode_table(table: Dict[str, Any], compact: bool = False) -> Dict[str, Any]:
+    """Replace a table's segments with its rows, or with the columnar encoding if compact."""
+    if "segments" not in table:
+        return table
+    segments = table.pop("segments")
+    if compact:
+        table.update(_columnar(segments))
+    else:
+        table["rows"] = _rows(segments)
+    return table
@@ -0,0 +1,169 @@
+"""
+Rerun a recipe over the document store in parallel, without converting anything again.
+
+JSON outputs are written with a section index alongside (see section_index.py),
+so the API can serve single sections and paragraphs from them.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path, PurePath
+from typing import Any, Dict, Optional, Tuple
+
+from batch import load_progress
+from logs import configure_logging, get_logger
+from recipes.registry import registry
+from section_index import index_matches, load_index, write_indexed
+from store import DocumentStore
+
+log = get_logger(__name__)
+
+
+def default_output_dir(store: DocumentStore, recipe: str, compact: bool = False) -> Path:
+    """Where a recipe's outputs for the store go unless told otherwise."""
+    return store.directory / "outputs" / (f"{recipe}-compact" if compact else recipe)
+
+
+def _output_path(output_dir: Path, name: str, suffix: str) -> Path:
+    """Where a stored document's output goes, keeping a relative name's directories."""
+    parts = PurePath(name).parts
+    if PurePath(name).is_absolute() or ".." in parts:
+        # Only ever write inside the output directory
+        parts = (PurePath(name).name,)
+    return output_dir.joinpath(*parts[:-1], parts[-1] + suffix)
+
+
+def _simplify_file(store_dir: str, key: str, output_path: str, recipe: str, stream: bool,
+                   compact: bool, version: str) -> Dict[str, Any]:
+    """Apply a recipe to one stored document inside a worker, reporting the outcome rather than raising."""
+    start = time.perf_counter()
+    try:
+        document = DocumentStore(store_dir).load(key)
+        conversion_recipe = registry.get_recipe(recipe, compact=compact)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        if stream:
+            separators = (",", ":") if compact else None
+            with open(output_path, 'w', encoding='utf-8') as f:
+                for section in conversion_recipe.iter_sections(document):
+                    f.write(json.dumps(section, ensure_ascii=False, separators=separators) + "\n")
+        else:
+            write_indexed(conversion_recipe.simplify_document(document), output_path, compact,
+                          meta={"key": key, "recipe": recipe, "version": version, "compact": compact})
+        return {"status": "done", "pages": document.num_pages(),
+                "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}",
+                "seconds": round(time.perf_counter() - start, 3)}
+
+
+def run_resimplify(store_dir: str = None, output_dir: str = None, recipe: str = "default",
+                   workers: int = None, stream: bool = False, compact: bool = False) -> Dict[str, Any]:
+    """Apply a recipe to every document in the store and return throughput statistics.
+
+    Outputs go under output_dir, by default outputs/<recipe> in the store, named
+    after the stored documents. Every finished document is appended to
+    resimplify.jsonl there; a rerun skips documents whose output is still current,
+    i.e. was produced from the same stored document by the same recipe version
+    (see ConversionRecipe.output_version) with the same options, as does a JSON
+    output whose index says so.
+    """
+    store = DocumentStore(store_dir)
+    version = type(registry.get_recipe(recipe)).output_version()
+    workers = workers or os.cpu_count() or 1
+    suffix = '.ndjson' if stream else '.json'
+    output_dir = Path(output_dir or default_output_dir(store, recipe, compact))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    progress_path = output_dir / "resimplify.jsonl"
+    progress = load_progress(progress_path, field="name")
+
+    pending = []
+    skipped = 0
+    for name, entry in sorted(store.entries().items()):
+        output_path = _output_path(output_dir, name, suffix)
+        previous = progress.get(name)
+        if (previous and previous["status"] == "done" and previous["key"] == entry["key"]
+                and previous["recipe"] == recipe and previous["version"] == version
+                and previous["compact"] == compact and previous["output"] == str(output_path)
+                and output_path.exists()):
+            skipped += 1
+            continue
+        if not stream and _current_index(output_path, entry["key"], recipe, version, compact) is not None:
+            # Made on demand for the API since the last run
+            skipped += 1
+            continue
+        pending.append((name, entry["key"], output_path))
+
+    log.info(f"Simplifying {len(pending)} stored documents with {recipe} (version {version}) "
+             f"on {workers} workers ({skipped} already current)",
+             extra={"pending": len(pending), "recipe": recipe, "version": version, "workers": workers,
+                    "skipped": skipped})
+
+    stats = {"simplified": 0, "failed": 0, "skipped": skipped, "pages": 0}
+    start = time.perf_counter()
+
+    if pending:
+        # Spawn like the other pools, so workers don't inherit the parent's threads
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=configure_logging) as executor, \
+                open(progress_path, 'a', encoding='utf-8') as progress_file:
+            futures = {
+                executor.submit(_simplify_file, str(store.directory), key, str(output_path), recipe,
+                                stream, compact, version):
+                    (name, key, output_path)
+                for name, key, output_path in pending
+            }
+            for future in as_completed(futures):
+                name, key, output_path = futures[future]
+                record = {"name": name, "key": key, "output": str(output_path), "recipe": recipe,
+                          "version": version, "compact": compact, **future.result()}
+                progress_file.write(json.dumps(record) + "\n")
+                progress_file.flush()
+
+                done = stats["simplified"] + stats["failed"] + 1
+                if record["status"] == "done":
+                    stats["simplified"] += 1
+                    stats["pages"] += record["pages"]
+                else:
+                    stats["failed"] += 1
+                    log.error(f"[{done}/{len(pending)}] {name}: FAILED {record['error']}",
+                              extra={"document": name, "error": record["error"]})
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_second"] = round(stats["simplified"] / elapsed, 3) if elapsed else 0.0
+    stats["output_dir"] = str(output_dir)
+    return stats
+
+
+def _current_index(output_path: Path, key: str, recipe: str, version: str,
+                   compact: bool) -> Optional[Dict[str, Any]]:
+    """The index of an output if it was made from the stored document by this recipe version."""
+    index = load_index(output_path)
+    meta = {"key": key, "recipe": recipe, "version": version, "compact": compact}
+    if index is None or index["meta"] != meta or not index_matches(output_path, index):
+        return None
+    return index
+
+
+def simplified_output(store: DocumentStore, name: str, recipe: str = "default",
+                      compact: bool = False) -> Optional[Tuple[Path, Dict[str, Any]]]:
+    """A stored document's indexed JSON output for a recipe and its index, made now if not current.
+
+    Returns None if there is no document of that name in the store.
+    """
+    entry = store.entries().get(name)
+    if entry is None:
+        return None
+    version = type(registry.get_recipe(recipe)).output_version()
+    output_path = _output_path(default_output_dir(store, recipe, compact), name, '.json')
+    index = _current_index(output_path, entry["key"], recipe, version, compact)
+    if index is None:
+        result = _simplify_file(str(store.directory), entry["key"], str(output_path), recipe,
+                                False, compact, version)
+        if result["status"] != "done":
+            raise RuntimeError(result["error"])
+        index = load_index(output_path)
+    return output_path, index
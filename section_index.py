@@ -0,0 +1,211 @@
+"""
+Recipe output written with an index of where each section and numbered paragraph is.
+
+The output is encoded exactly as json.dump would encode it, while noting the byte
+range of every section (subsections included) and of every content item with a
+paragraph number. The index goes in a sidecar file next to the output, so one
+section or paragraph can be served by slicing the output through mmap, without
+reading or parsing the rest of it. The index records which file the output is, by
+inode, size and modification time, so a slice is only served from the output the
+index was made for.
+"""
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Separators json.dump uses with an indent, and for compact output
+INDENTED_SEPARATORS = (",", ": ")
+COMPACT_SEPARATORS = (",", ":")
+
+Span = Tuple[int, int]
+
+
+class StaleIndexError(Exception):
+    """The output no longer matches its index, e.g. because both are being rewritten."""
+
+
+def index_path(output_path: Path) -> Path:
+    return Path(f"{output_path}.index")
+
+
+def _temp_path(path: Path) -> Path:
+    """A temporary name next to path, unique to this process and thread."""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+class _IndexedWriter:
+    """Encodes a recipe's output, noting the byte ranges of its sections and paragraphs."""
+
+    def __init__(self, f, compact: bool):
+        self.f = f
+        self.indent = None if compact else 2
+        self.item_separator, self.key_separator = COMPACT_SEPARATORS if compact else INDENTED_SEPARATORS
+        self.position = 0
+        self.sections: List[Dict[str, Any]] = []
+        self.paragraphs: List[List[int]] = []
+
+    def write(self, text: str) -> None:
+        data = text.encode('utf-8')
+        self.f.write(data)
+        self.position += len(data)
+
+    def newline(self, level: int) -> None:
+        if self.indent is not None:
+            self.write("\n" + " " * (self.indent * level))
+
+    def value(self, value: Any, level: int) -> None:
+        """Encode a value as a whole, indented for its nesting level."""
+        text = json.dumps(value, ensure_ascii=False, indent=self.indent,
+                          separators=(self.item_separator, self.key_separator))
+        if self.indent is not None:
+            text = text.replace("\n", "\n" + " " * (self.indent * level))
+        self.write(text)
+
+    def items(self, items: List[Any], level: int, encode) -> None:
+        """Encode a list, encoding each item with encode(item, level)."""
+        if not items:
+            self.write("[]")
+            return
+        self.write("[")
+        for i, item in enumerate(items):
+            if i:
+                self.write(self.item_separator)
+            self.newline(level + 1)
+            encode(item, level + 1)
+        self.newline(level)
+        self.write("]")
+
+    def fields(self, fields: Dict[str, Any], level: int, encode) -> None:
+        """Encode a dict, encoding each value with encode(key, value, level)."""
+        if not fields:
+            self.write("{}")
+            return
+        self.write("{")
+        for i, (key, value) in enumerate(fields.items()):
+            if i:
+                self.write(self.item_separator)
+            self.newline(level + 1)
+            self.write(json.dumps(key, ensure_ascii=False) + self.key_separator)
+            encode(key, value, level + 1)
+        self.newline(level)
+        self.write("}")
+
+    def content_item(self, item: Any, level: int) -> None:
+        start = self.position
+        self.value(item, level)
+        if isinstance(item, dict) and isinstance(item.get("number"), int):
+            self.paragraphs.append([item["number"], start, self.position, len(self.sections) - 1])
+
+    def section(self, section: Dict[str, Any], level: int, path: List[str]) -> None:
+        entry = {
+            "title": section.get("title", ""),
+            "path": [*path, section.get("title", "")],
+            "level": section.get("level"),
+            "start": self.position,
+        }
+        self.sections.append(entry)
+
+        def encode(key: str, value: Any, level: int) -> None:
+            if key == "content" and isinstance(value, list):
+                self.items(value, level, self.content_item)
+            elif key == "subsections" and isinstance(value, list):
+                self.items(value, level, lambda subsection, level: self.section(subsection, level, entry["path"]))
+            else:
+                self.value(value, level)
+
+        self.fields(section, level, encode)
+        entry["end"] = self.position
+
+    def document(self, simplified: Dict[str, Any]) -> None:
+        def encode(key: str, value: Any, level: int) -> None:
+            if key == "document" and isinstance(value, list):
+                self.items(value, level, lambda section, level: self.section(section, level, []))
+            else:
+                self.value(value, level)
+
+        self.fields(simplified, 0, encode)
+
+
+def write_indexed(simplified: Dict[str, Any], output_path: Path, compact: bool = False,
+                  meta: Dict[str, Any] = None) -> None:
+    """Write a recipe's output as JSON, the same as json.dump would, with its index alongside.
+
+    Both files are written then renamed into place, so a reader never sees a partial
+    file, the index first. A reader can still pair the index with the output from
+    before or after it, which read_spans detects from the file identity the index
+    records. meta is kept in the index, e.g. to tell whether the output is still current.
+    """
+    output_path = Path(output_path)
+    tmp_output = _temp_path(output_path)
+    with open(tmp_output, 'wb') as f:
+        writer = _IndexedWriter(f, compact)
+        writer.document(simplified)
+        f.flush()
+        # Renaming keeps the file's inode and modification time
+        output = _identity(os.fstat(f.fileno()))
+
+    index = {"meta": meta or {}, "output": output,
+             "sections": writer.sections, "paragraphs": writer.paragraphs}
+    tmp_index = _temp_path(index_path(output_path))
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+    os.replace(tmp_index, index_path(output_path))
+    os.replace(tmp_output, output_path)
+
+
+def _identity(stat: os.stat_result) -> Dict[str, int]:
+    """What tells one version of an output file from another, without reading it."""
+    return {"inode": stat.st_ino, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def index_matches(output_path: Path, index: Dict[str, Any]) -> bool:
+    """Whether an output is still the file its index was made for."""
+    try:
+        return _identity(os.stat(output_path)) == index.get("output")
+    except OSError:
+        return False
+
+
+def load_index(output_path: Path) -> Optional[Dict[str, Any]]:
+    """The index of an output, or None if it has none."""
+    try:
+        with open(index_path(output_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_sections(index: Dict[str, Any], title: str) -> List[Dict[str, Any]]:
+    """Sections with exactly this title or, failing any, those whose title starts with it."""
+    sections = [section for section in index["sections"] if section["title"] == title]
+    return sections or [section for section in index["sections"] if section["title"].startswith(title)]
+
+
+def find_paragraphs(index: Dict[str, Any], number: int, sections: List[Dict[str, Any]] = None) -> List[Span]:
+    """Byte ranges of the paragraphs with a number, optionally only those within some sections."""
+    spans = []
+    for paragraph_number, start, end, section_no in index["paragraphs"]:
+        if paragraph_number != number:
+            continue
+        if sections is not None:
+            # A paragraph is within a section if its own section is, subsections included
+            owner = index["sections"][section_no]
+            if not any(section["start"] <= owner["start"] and owner["end"] <= section["end"]
+                       for section in sections):
+                continue
+        spans.append((start, end))
+    return spans
+
+
+def read_spans(output_path: Path, index: Dict[str, Any], spans: List[Span]) -> bytes:
+    """The given byte ranges of an output, as a JSON array, read through mmap.
+
+    Raises StaleIndexError if the output isn't the one the index was made for.
+    """
+    with open(output_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if _identity(os.fstat(f.fileno())) != index.get("output"):
+            raise StaleIndexError(f"{output_path} does not match its index")
+        return b"[" + b",".join(mapped[start:end] for start, end in spans) + b"]"
@@ -0,0 +1,134 @@
+"""
+Split a PDF into page-range shards and stitch the converted shards back together,
+or extract a single page range to convert on its own.
+
+Shards always break on page boundaries. Docling already reports a table that runs
+across pages as one table per page, so a table cut by a shard boundary comes back
+as two consecutive tables with the same header, which the recipes' table merging
+rejoins exactly as it does for page breaks.
+"""
+import io
+import re
+from typing import Any, Dict, List, Tuple, Union
+
+import pypdfium2 as pdfium
+from docling_core.types.doc import DoclingDocument
+
+# Matches references to items held in the document's lists, e.g. "#/texts/12"
+_ITEM_REF = re.compile(r"^#/(\w+)/(\d+)$")
+
+_ITEM_LISTS = ("groups", "texts", "pictures", "tables", "key_value_items")
+
+
+def page_count(pdf: Union[str, bytes]) -> int:
+    """Number of pages in a PDF, given as a path or its bytes."""
+    document = pdfium.PdfDocument(pdf)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def parse_page_range(pages: str) -> Tuple[int, int]:
+    """Parse a 1-based, inclusive page range such as "3-10", or a single page such as "5"."""
+    first, dash, last = pages.partition("-")
+    try:
+        first_page = int(first)
+        last_page = int(last) if dash else first_page
+    except ValueError:
+        raise ValueError(f"Invalid page range: {pages}")
+    if first_page < 1 or last_page < first_page:
+        raise ValueError(f"Invalid page range: {pages}")
+    return first_page, last_page
+
+
+def _save_pages(source: pdfium.PdfDocument, page_indices: List[int]) -> bytes:
+    """Copy pages of an open PDF into a new PDF held in memory."""
+    shard = pdfium.PdfDocument.new()
+    try:
+        shard.import_pages(source, pages=page_indices)
+        buffer = io.BytesIO()
+        shard.save(buffer)
+    finally:
+        shard.close()
+    return buffer.getvalue()
+
+
+def extract_pages(pdf: Union[str, bytes], first_page: int, last_page: int) -> bytes:
+    """Pages first_page to last_page (1-based, inclusive) of a PDF, as a new PDF in memory.
+
+    A range running past the end of the PDF stops at its last page.
+    """
+    source = pdfium.PdfDocument(pdf)
+    try:
+        total = len(source)
+        if first_page > total:
+            raise ValueError(f"Page {first_page} is past the end of the {total}-page PDF")
+        return _save_pages(source, list(range(first_page - 1, min(last_page, total))))
+    finally:
+        source.close()
+
+
+def split_pdf(pdf: Union[str, bytes], pages_per_shard: int) -> List[Tuple[bytes, int]]:
+    """Split a PDF, given as a path or its bytes, into consecutive page ranges held in memory.
+
+    Returns (shard bytes, number of pages before the shard) pairs in page order.
+    """
+    shards = []
+    source = pdfium.PdfDocument(pdf)
+    try:
+        total = len(source)
+        for first_page in range(0, total, pages_per_shard):
+            last_page = min(first_page + pages_per_shard, total)
+            shards.append((_save_pages(source, list(range(first_page, last_page))), first_page))
+    finally:
+        source.close()
+    return shards
+
+
+def _shift(node: Any, ref_offsets: Dict[str, int], page_offset: int) -> Any:
+    """Renumber item references and page numbers in a dumped document, in place."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("$ref", "self_ref") and isinstance(value, str):
+                match = _ITEM_REF.match(value)
+                if match and match.group(1) in ref_offsets:
+                    node[key] = f"#/{match.group(1)}/{int(match.group(2)) + ref_offsets[match.group(1)]}"
+            elif key == "page_no" and isinstance(value, int):
+                node[key] = value + page_offset
+            else:
+                _shift(value, ref_offsets, page_offset)
+    elif isinstance(node, list):
+        for value in node:
+            _shift(value, ref_offsets, page_offset)
+    return node
+
+
+def stitch_documents(parts: List[Tuple[DoclingDocument, int]], name: str) -> DoclingDocument:
+    """Join converted shards, given as (document, page offset) pairs, into one document in page order."""
+    stitched = None
+    for document, page_offset in sorted(parts, key=lambda part: part[1]):
+        data = document.export_to_dict()
+        if stitched is None:
+            # The first shard becomes the base document
+            ref_offsets = {}
+        else:
+            ref_offsets = {list_name: len(stitched[list_name]) for list_name in _ITEM_LISTS}
+        _shift(data, ref_offsets, page_offset)
+        pages = {str(page["page_no"]): page for page in data["pages"].values()}
+
+        if stitched is None:
+            stitched = data
+            stitched["pages"] = pages
+            continue
+
+        for list_name in _ITEM_LISTS:
+            stitched[list_name].extend(data[list_name])
+        for root in ("body", "furniture"):
+            stitched[root]["children"].extend(data[root]["children"])
+        stitched["pages"].update(pages)
+
+    stitched["name"] = name
+    if stitched.get("origin"):
+        stitched["origin"]["filename"] = f"{name}.pdf"
+    return DoclingDocument.model_validate(stitched)
@@ -0,0 +1,97 @@
+"""
+Archive of docling documents, so recipes can be rerun without converting again.
+
+Unlike the conversion cache, nothing is ever evicted. Each document is stored once
+under its conversion key (see cache.py) as zlib-compressed JSON, and is
+decompressed as it is read back, so the compressed file is never held whole.
+index.jsonl records the name each document was stored under; when a name is
+stored again, e.g. after reconverting with other options, the latest entry wins.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from docling_core.types.doc import DoclingDocument
+
+# Documents are only kept when a store directory is given, here or on the command line
+STORE_DIR = os.environ.get("UNPDF_STORE_DIR") or None
+
+# Bytes of a stored file read at a time
+READ_CHUNK = 1024 * 1024
+
+
+def store_name(name: str, pages: Tuple[int, int] = None) -> str:
+    """Name to store a document under, marking a page range so it doesn't replace the whole PDF."""
+    return f"{name}.pages-{pages[0]}-{pages[1]}" if pages is not None else name
+
+
+class DocumentStore:
+    """Docling documents on disk, by conversion key, with an index of their names."""
+
+    def __init__(self, directory: str = None):
+        self.directory = Path(directory or STORE_DIR)
+        self.index_path = self.directory / "index.jsonl"
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._index_offset = 0
+
+    def _path(self, key: str) -> Path:
+        # Spread over subdirectories, so an archive of many documents stays quick to list
+        return self.directory / "documents" / key[:2] / f"{key}.json.zz"
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """Latest index entry for each name, including those other processes have added."""
+        with self._lock:
+            if self.index_path.exists():
+                with open(self.index_path, 'rb') as f:
+                    # Only read what has been appended since last time
+                    f.seek(self._index_offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            # Still being written; read it next time
+                            break
+                        self._index_offset += len(line)
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A process killed mid-write can leave a truncated line
+                            continue
+                        self._entries[entry["name"]] = entry
+            return dict(self._entries)
+
+    def put(self, key: str, document: DoclingDocument, name: str, source: str = None) -> None:
+        """Store a document under its key, unless it is already there, and index it by name."""
+        path = self._path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial file
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(document.model_dump_json().encode(), 6))
+            os.replace(tmp_path, path)
+
+        entry = {"name": name, "key": key, "source": source, "pages": document.num_pages(),
+                 "stored_at": round(time.time(), 3)}
+        current = self.entries().get(name)
+        if current is not None and current["key"] == key:
+            return
+        with self._lock:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def load(self, key: str) -> DoclingDocument:
+        """Read a stored document back, raising KeyError if there is none under the key."""
+        decompressor = zlib.decompressobj()
+        data = bytearray()
+        try:
+            with open(self._path(key), 'rb') as f:
+                while chunk := f.read(READ_CHUNK):
+                    data += decompressor.decompress(chunk)
+        except FileNotFoundError:
+            raise KeyError(key)
+        data += decompressor.flush()
+        return DoclingDocument.model_validate_json(data)
@@ -1,65 +1,270 @@
+import asyncio
 import json
+import logging
+import math
+import os
 import sys
+from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-from docling.datamodel.base_models import InputFormat
+from docling.datamodel.base_models import DocumentStream
 from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling_core.types.doc import DoclingDocument
 
+from cache import ConversionCache
+from converter import TABLE_MODES, TABLE_STRUCTURE_MODES, build_converter, build_pipeline_options
+from logs import LOG_LEVEL, configure_logging, get_logger
+from metrics import document_pages, pages_total, peak_rss_bytes, record_stages, stage
 from recipes.registry import registry
+from sharding import extract_pages, page_count, parse_page_range, stitch_documents
+from store import STORE_DIR, DocumentStore, store_name
+from workers import ConversionPool
+
+if TYPE_CHECKING:
+    from docling.document_converter import DocumentConverter
+
+log = get_logger(__name__)
 
 
 def analyze_section(text):
-    """Analyze a section header for debugging."""
-    print(f"\nSection Analysis:")
-    print(f"Text: {text.text}")
-    print(f"Level: {text.level}")
-    print("Available attributes:", [attr for attr in dir(text) 
-          if not attr.startswith('_') and not callable(getattr(text, attr))])
-    if hasattr(text, 'parent'):
-        print(f"Parent: {text.parent}")
-    if hasattr(text, 'children'):
-        print(f"Children: {text.children}")
+    """Log a section header's details at debug level, for debugging."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    log.debug("Section analysis", extra={
+        "text": text.text,
+        "level": text.level,
+        "attributes": [attr for attr in dir(text)
+                       if not attr.startswith('_') and not callable(getattr(text, attr))],
+        "parent": getattr(text, 'parent', None),
+        "children": getattr(text, 'children', None),
+    })
 
 
-def process_pdf(pdf_path: str, output_path: str = None, recipe: str = "default") -> None:
-    """Process a PDF file and save simplified JSON output."""
-    pipeline_options = PdfPipelineOptions()
-    pipeline_options.do_ocr = False
-    pipeline_options.do_table_structure = True
-    
-    doc_converter = DocumentConverter(
-        allowed_formats=[InputFormat.PDF],
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-            ),
-        },
-    )
+def process_pdf(pdf_path: str, output_path: str = None, recipe: str = "default",
+                use_cache: bool = True, stream: bool = False, shard_pages: int = None,
+                workers: int = None, doc_converter: "DocumentConverter" = None,
+                pipeline_options: PdfPipelineOptions = None,
+                pages: Tuple[int, int] = None, compact: bool = False,
+                store: str = None, name: str = None, cache: ConversionCache = None) -> DoclingDocument:
+    """Process a PDF file, save simplified JSON output and return the docling document.
+    
+    Pass doc_converter to reuse an already loaded converter across calls; it must
+    have been built with the same pipeline options, which default to the recipe's.
+    Likewise pass cache to reuse a conversion cache rather than open the disk cache
+    again; it is only used with use_cache set.
+    
+    With pages, a (first, last) 1-based inclusive range, only those pages are
+    converted, keeping their page numbers.
+    
+    With compact set, tables are encoded as columns of deduplicated strings and the
+    JSON is written without indentation or spaces.
     
+    With store, a document store directory, the docling document is also kept there
+    under name (by default the PDF's file name without its extension), so recipes
+    can be rerun over it later without converting again.
+    
+    With stream set, sections are written as NDJSON (one top-level section per line)
+    as the recipe produces them, instead of building the whole document first.
+    
+    With shard_pages set, the PDF is split into shards of that many pages which are
+    converted in parallel by a pool of worker processes.
+    """
     # Get the requested recipe
-    conversion_recipe = registry.get_recipe(recipe)
+    conversion_recipe = registry.get_recipe(recipe, compact=compact)
+    if pipeline_options is None:
+        pipeline_options = build_pipeline_options(**conversion_recipe.pipeline_defaults)
+    
+    # Reuse an earlier conversion of the same PDF if there is one
+    if not use_cache:
+        cache = None
+    elif cache is None:
+        cache = ConversionCache(memory_items=0)
+    document = None
+    if cache is not None or store:
+        with stage("cache_lookup"):
+            cache_key = ConversionCache.make_key(ConversionCache.pdf_digest(pdf_path), pipeline_options, pages)
+            if cache is not None:
+                document = cache.get(cache_key)
     
-    result = doc_converter.convert(pdf_path)
-    simplified_doc = conversion_recipe.simplify_document(result.document)
+    if document is None:
+        if shard_pages:
+            # No point starting more workers (and loading more models) than there are shards
+            total_pages = page_count(pdf_path)
+            if pages is not None:
+                total_pages = min(pages[1], total_pages) - pages[0] + 1
+            shards = max(1, math.ceil(total_pages / shard_pages))
+            pool = ConversionPool(workers=min(workers or os.cpu_count() or 1, shards))
+            pool.start()
+            try:
+                document = asyncio.run(pool.convert_document(
+                    pdf_path, shard_pages=shard_pages, pipeline_options=pipeline_options, pages=pages
+                ))
+            finally:
+                pool.shutdown()
+        else:
+            if doc_converter is None:
+                with stage("load_models"):
+                    doc_converter = build_converter(pipeline_options)
+            source = pdf_path
+            if pages is not None:
+                with stage("split"):
+                    source = DocumentStream(name=Path(pdf_path).name,
+                                            stream=BytesIO(extract_pages(pdf_path, *pages)))
+            with stage("docling", profile=True):
+                document = doc_converter.convert(source).document
+            if pages is not None and pages[0] > 1:
+                with stage("stitch"):
+                    document = stitch_documents([(document, pages[0] - 1)], Path(pdf_path).stem)
+            pages_total.inc(document.num_pages())
+            document_pages.observe(document.num_pages())
+        
+        if cache is not None:
+            with stage("cache_store"):
+                cache.put(cache_key, document)
+    
+    if store:
+        with stage("store"):
+            DocumentStore(store).put(cache_key, document, store_name(name or Path(pdf_path).stem, pages),
+                                     source=str(Path(pdf_path).resolve()))
     
     # Determine output path
     if output_path is None:
-        output_path = Path(pdf_path).with_suffix('.json')
+        output_path = Path(pdf_path).with_suffix('.ndjson' if stream else '.json')
+    
+    # Compact output leaves out indentation and the spaces after separators
+    separators = (",", ":") if compact else None
+    
+    if stream:
+        with stage("write"), open(output_path, 'w', encoding='utf-8') as f:
+            for section in conversion_recipe.iter_sections(document):
+                f.write(json.dumps(section, ensure_ascii=False, separators=separators) + "\n")
+        return document
+    
+    simplified_doc = conversion_recipe.simplify_document(document)
     
     # Save to JSON
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(simplified_doc, f, ensure_ascii=False, indent=2)
+    with stage("write"), open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(simplified_doc, f, ensure_ascii=False, indent=None if compact else 2,
+                  separators=separators)
+    
+    return document
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument("pdf_file", help="PDF file to convert")
+    parser.add_argument("pdf_file", nargs="*",
+                      help="PDF file to convert, or several files, directories or glob patterns for a batch")
+    parser.add_argument("--resimplify", action="store_true",
+                      help="Rerun --recipe over every document in the store instead of converting PDFs, "
+                           "skipping those whose output is current")
     parser.add_argument("--recipe", default="default", 
                       choices=registry.list_recipes(),
                       help="Conversion recipe to use")
+    parser.add_argument("--no-cache", action="store_true",
+                      help="Always run docling, ignoring and not updating the conversion cache")
+    parser.add_argument("--ndjson", action="store_true",
+                      help="Write sections as NDJSON while they are produced")
+    parser.add_argument("--shard-pages", type=int,
+                      help="Split the PDF into shards of this many pages and convert them in parallel")
+    parser.add_argument("--workers", type=int,
+                      help="Worker processes for batch, sharded or --resimplify runs (default: number of CPU cores)")
+    parser.add_argument("--manifest",
+                      help="Batch: file listing PDFs, directories or glob patterns, one per line")
+    parser.add_argument("--output-dir",
+                      help="Batch: directory for the outputs (default: next to each PDF)")
+    parser.add_argument("--progress",
+                      help="Batch: progress manifest used to resume an interrupted run "
+                           "(default: progress.jsonl in the output directory)")
+    parser.add_argument("--table-structure", choices=TABLE_STRUCTURE_MODES,
+                      help="Table-structure inference: on every table, auto (only where the text "
+                           "has columns) or off (default: the recipe's, usually on)")
+    parser.add_argument("--table-mode", choices=TABLE_MODES,
+                      help="TableFormer mode (default: the recipe's, usually fast)")
+    parser.add_argument("--ocr", action=argparse.BooleanOptionalAction,
+                      help="Run OCR on the pages (default: the recipe's, usually off)")
+    parser.add_argument("--pages",
+                      help="Only convert this page range, e.g. 3-10 or 5")
+    parser.add_argument("--compact", action="store_true",
+                      help="Encode tables as columns of deduplicated strings and write minified JSON")
+    parser.add_argument("--store", default=STORE_DIR,
+                      help="Document store directory: keep each docling document there for --resimplify "
+                           "(default: $UNPDF_STORE_DIR, unset means none)")
+    parser.add_argument("--profile", choices=["stages", "cprofile"],
+                      help="Print a per-stage timing breakdown (plus cProfile output) to stderr")
+    parser.add_argument("--log-level", default=LOG_LEVEL,
+                      help="Log level, optionally with others per logger, e.g. INFO,unpdf.recipes=DEBUG "
+                           "to trace recipe decisions (default: $UNPDF_LOG_LEVEL, or INFO)")
     args = parser.parse_args()
+    try:
+        configure_logging(level=args.log_level)
+    except ValueError as e:
+        parser.error(str(e))
+    # Worker processes read it when they set up their logging
+    os.environ["UNPDF_LOG_LEVEL"] = args.log_level
+    
+    if args.resimplify:
+        if args.pdf_file or args.manifest:
+            parser.error("--resimplify reruns the recipe over the store and takes no PDFs")
+        if not args.store:
+            parser.error("--resimplify needs a document store: give --store or set UNPDF_STORE_DIR")
+        from resimplify import run_resimplify
+        stats = run_resimplify(args.store, output_dir=args.output_dir, recipe=args.recipe,
+                               workers=args.workers, stream=args.ndjson, compact=args.compact)
+        print(f"Simplified {stats['simplified']} documents ({stats['pages']} pages) in {stats['seconds']}s: "
+              f"{stats['docs_per_second']} docs/sec, {stats['failed']} failed, "
+              f"{stats['skipped']} already current, written to {stats['output_dir']}")
+        sys.exit(1 if stats["failed"] else 0)
+    
+    if not args.pdf_file and not args.manifest:
+        parser.error("give a PDF file, or files, directories, glob patterns or --manifest for a batch")
+    batch_mode = (args.manifest or args.output_dir or args.progress or len(args.pdf_file) != 1
+                  or not os.path.isfile(args.pdf_file[0]))
+    if batch_mode and args.shard_pages:
+        parser.error("--shard-pages converts a single PDF and cannot be used for a batch")
+    if batch_mode and args.pages:
+        parser.error("--pages converts part of a single PDF and cannot be used for a batch")
+    
+    pages = None
+    if args.pages:
+        try:
+            pages = parse_page_range(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    # The recipe's pipeline options, with any given on the command line applied on top
+    overrides = {
+        name: value for name, value in (("table_structure", args.table_structure),
+                                        ("table_mode", args.table_mode), ("ocr", args.ocr))
+        if value is not None
+    }
+    pipeline_options = build_pipeline_options(
+        **{**registry.get_recipe(args.recipe).pipeline_defaults, **overrides}
+    )
+    
+    if batch_mode:
+        from batch import run_batch
+        stats = run_batch(args.pdf_file, output_dir=args.output_dir, recipe=args.recipe,
+                          workers=args.workers, manifest=args.manifest,
+                          progress_path=args.progress, stream=args.ndjson,
+                          use_cache=not args.no_cache, pipeline_options=pipeline_options,
+                          compact=args.compact, store=args.store)
+        print(f"Converted {stats['converted']} PDFs ({stats['pages']} pages) in {stats['seconds']}s: "
+              f"{stats['docs_per_second']} docs/sec, {stats['pages_per_second']} pages/sec, "
+              f"{stats['failed']} failed, {stats['skipped']} skipped")
+        sys.exit(1 if stats["failed"] else 0)
+    
+    with record_stages(cprofile=args.profile == "cprofile") as recorder:
+        document = process_pdf(args.pdf_file[0], recipe=args.recipe, use_cache=not args.no_cache,
+                               stream=args.ndjson, shard_pages=args.shard_pages,
+                               workers=args.workers, pipeline_options=pipeline_options, pages=pages,
+                               compact=args.compact, store=args.store)
     
-    process_pdf(args.pdf_file, recipe=args.recipe)
+    if args.profile:
+        recorder.info["pages"] = document.num_pages()
+        recorder.info["peak_rss_bytes"] = peak_rss_bytes()
+        profile = recorder.as_dict()
+        for name, text in profile.pop("cprofile", {}).items():
+            print(f"cProfile: {name}\n{text}", file=sys.stderr)
+        print(json.dumps(profile, indent=2), file=sys.stderr)
@@ -0,0 +1,779 @@
+"""
+Process pool that runs docling conversions away from the API event loop.
+
+Each worker keeps a small LRU pool of converters keyed by pipeline options, so
+requests can ask for OCR or another table mode without reloading models every
+time. By default every worker is spawned fresh and loads its own copy of the models.
+In pre-fork mode the models are loaded once in the parent and the workers are
+forked from it, sharing the model memory copy-on-write. A process can only be
+forked safely before torch has started its intra-op (OpenMP) thread pool, which
+the children would inherit in an unusable state, so the parent loads the models
+on one thread and each worker sets its thread count back once forked.
+
+Every conversion is bounded (see ConversionLimits): documents over a page limit
+are refused, and a conversion that runs too long or allocates too much is
+stopped with an error. Each worker process has an executor of its own and takes
+one conversion at a time, so a worker that has done a set number of conversions,
+grown past a memory high-water mark, or had a conversion stopped, says so with
+its result and is replaced on its own by a fresh process, while the others carry on.
+A worker is only handed another conversion once its last one has finished, even
+if whoever was waiting for it has gone. The API process also holds each
+conversion to a hard deadline, a little past the worker's own timeout, and kills
+a worker stuck past it in native code that the worker's timer can't interrupt.
+A worker whose process dies, killed like that or by the kernel, is replaced too.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import gc
+import multiprocessing
+import cProfile
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from docling.datamodel.base_models import DocumentStream
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling_core.types.doc import DoclingDocument
+
+from cache import ConversionCache
+from converter import ConverterPool, build_pipeline_options, default_pipeline_options, warm_up
+from logs import configure_logging, get_logger
+from metrics import (converter_builds, converter_evictions, current_recorder, current_rss_bytes,
+                     document_pages, format_profile, limit_errors, memory_usage, observe_stage, pages_total,
+                     peak_rss_bytes, stage, worker_peak_rss, workers_recycled)
+from recipes.registry import registry
+from sharding import extract_pages, page_count, split_pdf, stitch_documents
+from store import DocumentStore, store_name
+
+# A PDF given by its path, or its bytes held in memory
+PdfSource = Union[str, bytes]
+
+log = get_logger(__name__)
+
+# Recipes whose pipeline options every worker loads at startup, besides the defaults
+WARM_RECIPES = [name for name in os.environ.get("UNPDF_WARM_RECIPES", "").split(",") if name]
+
+
+class ConversionLimits(NamedTuple):
+    """Bounds on each conversion and on each worker process; 0 means no limit."""
+    # Pages in a document, or in the requested page range
+    max_pages: int = int(os.environ.get("UNPDF_MAX_PAGES", "0"))
+    # Seconds a worker may spend converting one PDF or shard
+    timeout: float = float(os.environ.get("UNPDF_CONVERSION_TIMEOUT", "0"))
+    # Bytes a worker may allocate while converting one PDF or shard (Linux)
+    max_memory: int = int(os.environ.get("UNPDF_CONVERSION_MAX_MEMORY", "0"))
+    # Conversions after which a worker is replaced
+    worker_max_conversions: int = int(os.environ.get("UNPDF_WORKER_MAX_CONVERSIONS", "0"))
+    # RSS in bytes past which a worker is replaced after its current conversion
+    worker_max_rss: int = int(os.environ.get("UNPDF_WORKER_MAX_RSS", "0"))
+    # Seconds past the timeout after which the API process kills the worker itself
+    kill_grace: float = float(os.environ.get("UNPDF_CONVERSION_KILL_GRACE", "30"))
+
+
+class ConversionLimitError(Exception):
+    """Raised when a conversion is refused or stopped by one of its limits."""
+
+    limit = None
+
+
+class TooManyPagesError(ConversionLimitError):
+    limit = "pages"
+
+
+class ConversionMemoryError(ConversionLimitError):
+    limit = "memory"
+
+
+class ConversionTimeoutError(ConversionLimitError):
+    limit = "timeout"
+
+
+class WorkerCrashedError(Exception):
+    """Raised when the worker process converting a PDF dies before returning a result."""
+
+# Converters owned by this worker process. Those for the default options and
+# WARM_RECIPES are built by the pool initializer, or inherited from the parent in
+# pre-fork mode; others are built the first time a conversion asks for them.
+_converters = ConverterPool()
+
+# This worker's limits and state, set by the pool initializer
+_limits = ConversionLimits()
+_conversions = 0
+# Why this worker should be replaced, if it should
+_recycle_reason: Optional[str] = None
+
+
+def _load_converter() -> None:
+    """Build and warm the converters loaded at startup in this process."""
+    startup_options = [default_pipeline_options()]
+    for recipe in WARM_RECIPES:
+        startup_options.append(build_pipeline_options(**registry.get_recipe(recipe).pipeline_defaults))
+
+    try:
+        for pipeline_options in startup_options:
+            _converters.get(pipeline_options)
+        log.info(f"Worker {os.getpid()}: models loaded successfully", extra={"pid": os.getpid()})
+    except Exception as e:
+        log.warning(f"Worker {os.getpid()}: model warmup failed: {e}", extra={"pid": os.getpid()})
+        # Continue anyway - models will load on first request
+
+
+def _set_torch_threads(threads: int) -> int:
+    """Set the number of intra-op threads torch uses in this process, returning the previous number."""
+    import torch
+
+    previous = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    return previous
+
+
+def _init_worker(limits: ConversionLimits = None, torch_threads: int = None) -> None:
+    """Make sure this worker process has a warmed converter.
+
+    torch_threads is given to workers forked from a parent that loaded the models
+    on one thread: each sets its own thread count, then converts the warm-up PDF
+    with the converter it inherited, so a worker that can't convert after the
+    fork shows it at startup rather than on its first request.
+    """
+    global _limits, _conversions, _recycle_reason
+    configure_logging()
+    _limits = limits or ConversionLimits()
+    # A worker forked to replace another starts afresh
+    _conversions, _recycle_reason = 0, None
+    if torch_threads:
+        _set_torch_threads(torch_threads)
+    if not _converters.builds:
+        _load_converter()
+    elif torch_threads:
+        try:
+            warm_up(_converters.get(default_pipeline_options()))
+        except Exception as e:
+            log.error(f"Worker {os.getpid()}: conversion after fork failed: {e}", extra={"pid": os.getpid()})
+
+
+def _data_bytes() -> Optional[int]:
+    """Size of this process's data segment and private mappings, as RLIMIT_DATA counts it (Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmData:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _raise_timeout(signum, frame) -> None:
+    global _recycle_reason
+    _recycle_reason = "timeout"
+    raise ConversionTimeoutError(f"Conversion took longer than {_limits.timeout} seconds")
+
+
+@contextmanager
+def _bounded() -> Iterator[None]:
+    """Stop the conversion inside the block if it runs over the worker's time or memory limit.
+
+    The timeout is a SIGALRM raising ConversionTimeoutError in the converting
+    thread; the memory limit is RLIMIT_DATA, set to what the process uses now plus
+    the allowance, so allocations past it fail. Either way the worker is recycled
+    afterwards, in case the interrupted conversion left anything behind.
+
+    Native code reports a failed allocation in its own way, often wrapped in
+    another error by docling, so any error raised while the process is close to
+    its memory limit counts as running out of memory.
+    """
+    global _recycle_reason
+    data_limit = None
+    used = None
+    if _limits.max_memory:
+        used = _data_bytes()
+        if used is not None:
+            data_limit = resource.getrlimit(resource.RLIMIT_DATA)
+            soft = used + _limits.max_memory
+            if data_limit[1] != resource.RLIM_INFINITY:
+                soft = min(soft, data_limit[1])
+            resource.setrlimit(resource.RLIMIT_DATA, (soft, data_limit[1]))
+    # Signals can only be handled in the main thread, which is where the worker runs tasks
+    timer = bool(_limits.timeout) and threading.current_thread() is threading.main_thread()
+    if timer:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, _limits.timeout)
+    try:
+        yield
+    except ConversionTimeoutError:
+        raise
+    except Exception as e:
+        if _recycle_reason == "timeout":
+            # The timeout, caught and re-raised as something else by the converter
+            raise ConversionTimeoutError(f"Conversion took longer than {_limits.timeout} seconds") from e
+        if data_limit is not None and (_allocation_failed(e) or _near_data_limit(used)):
+            _recycle_reason = "memory"
+            raise ConversionMemoryError(
+                f"Conversion needed more than {_limits.max_memory} bytes of memory"
+            ) from e
+        raise
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        if data_limit is not None:
+            resource.setrlimit(resource.RLIMIT_DATA, data_limit)
+
+
+# Messages of errors that native code raises for a failed allocation, e.g. torch's
+# CPU allocator and an uncaught std::bad_alloc
+_ALLOCATION_MESSAGES = ("can't allocate memory", "bad_alloc", "out of memory")
+
+# Share of the memory allowance in use past which an error counts as running out of memory
+_NEAR_LIMIT = 0.9
+
+
+def _allocation_failed(error: BaseException) -> bool:
+    """Whether an error, or one it was raised from or while handling, is an allocation failing."""
+    torch = sys.modules.get("torch")
+    errors = (MemoryError, torch.OutOfMemoryError) if torch is not None else (MemoryError,)
+    while error is not None:
+        if isinstance(error, errors) or (isinstance(error, OSError) and error.errno == errno.ENOMEM):
+            return True
+        if any(message in str(error).lower() for message in _ALLOCATION_MESSAGES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _near_data_limit(used_before: int) -> bool:
+    """Whether the process has allocated most of its allowance since it used used_before bytes."""
+    used = _data_bytes()
+    return used is not None and used - used_before >= _limits.max_memory * _NEAR_LIMIT
+
+
+try:
+    # glibc's malloc_trim, to hand freed heap pages back to the OS
+    _malloc_trim = ctypes.CDLL(ctypes.util.find_library("c")).malloc_trim
+except (OSError, AttributeError, TypeError):
+    _malloc_trim = None
+
+
+def _release_memory() -> None:
+    """Free what the last conversion left behind, so the worker's RSS reflects what it still holds."""
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+def _ready() -> int:
+    """No-op task used to start a worker process, returning its pid once its models are loaded."""
+    return os.getpid()
+
+
+def _convert(pdf: PdfSource, name: str, pipeline_options: PdfPipelineOptions,
+             profile: bool = False) -> Tuple[DoclingDocument, Dict[str, Any]]:
+    """Convert a PDF inside a worker process, returning the document and conversion stats."""
+    global _conversions, _recycle_reason
+    builds, evictions = _converters.builds, _converters.evictions
+    start = time.perf_counter()
+    converter = _converters.get(pipeline_options)
+    load_seconds = time.perf_counter() - start
+    # In-memory PDFs are handed to docling as a stream, so nothing is written to disk
+    source = pdf if isinstance(pdf, str) else DocumentStream(name=f"{name}.pdf", stream=BytesIO(pdf))
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        with _bounded():
+            document = converter.convert(source).document
+    finally:
+        if profiler:
+            profiler.disable()
+        _conversions += 1
+        if _recycle_reason is None:
+            if _limits.worker_max_conversions and _conversions >= _limits.worker_max_conversions:
+                _recycle_reason = "conversions"
+            elif _limits.worker_max_rss:
+                _release_memory()
+                if current_rss_bytes() > _limits.worker_max_rss:
+                    _recycle_reason = "memory"
+            if _recycle_reason is not None:
+                log.info(f"Worker {os.getpid()}: due for recycling after {_conversions} conversions "
+                         f"({_recycle_reason})",
+                         extra={"pid": os.getpid(), "reason": _recycle_reason, "conversions": _conversions,
+                                "rss_bytes": current_rss_bytes()})
+
+    stats = {
+        "seconds": time.perf_counter() - start,
+        "pages": document.num_pages(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "converters_built": _converters.builds - builds,
+        "converters_evicted": _converters.evictions - evictions,
+        "recycle": _recycle_reason,
+    }
+    if stats["converters_built"]:
+        stats["load_models_seconds"] = load_seconds
+    if profiler:
+        stats["cprofile"] = format_profile(profiler)
+    return document, stats
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the conversion backlog is full."""
+
+
+class _Worker:
+    """One worker process, in an executor of its own so it can be replaced alone.
+
+    The process is tracked by the pid it returns once started, rather than through
+    the executor's internals.
+    """
+
+    def __init__(self, context, limits: ConversionLimits, torch_threads: Optional[int]):
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(limits, torch_threads),
+        )
+        # Submitting a task starts the process; it finishes once the models are loaded
+        self.started: Future = self.executor.submit(_ready)
+        # Whether the executor has reported the process dead
+        self.crashed = False
+        # Why the pool killed the process, if it did
+        self.killed: Optional[str] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        """The process's pid, once it has loaded its models."""
+        if self.started.done() and not self.started.cancelled() and self.started.exception() is None:
+            return self.started.result()
+        return None
+
+    @property
+    def broken(self) -> bool:
+        """Whether the process has died, or been killed."""
+        if self.crashed or self.killed:
+            return True
+        if self.pid is None:
+            return (self.started.done() and not self.started.cancelled()
+                    and isinstance(self.started.exception(), BrokenExecutor))
+        try:
+            # WNOWAIT leaves the exited process for the executor to reap
+            return os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+        except ChildProcessError:
+            # Already reaped
+            return True
+
+    @property
+    def ready(self) -> bool:
+        """Whether the process has loaded its models and is still alive."""
+        return self.pid is not None and not self.broken
+
+    def kill(self, reason: str) -> None:
+        """Kill the process, which fails the conversion it is running with BrokenProcessPool."""
+        self.killed = reason
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class ConversionPool:
+    """Bounded pool of worker processes, each with its own warmed converters."""
+
+    def __init__(self, workers: int = None, max_backlog: int = None, cache: ConversionCache = None,
+                 prefork: bool = None, store: DocumentStore = None, limits: ConversionLimits = None):
+        self.workers = workers or int(os.environ.get("UNPDF_WORKERS", os.cpu_count() or 1))
+        if max_backlog is None:
+            max_backlog = int(os.environ.get("UNPDF_MAX_BACKLOG", self.workers * 4))
+        if prefork is None:
+            prefork = os.environ.get("UNPDF_PREFORK", "0") == "1"
+        self.max_backlog = max_backlog
+        self.prefork = prefork
+        self.cache = cache
+        self.store = store
+        self.limits = limits or ConversionLimits()
+        self.pipeline_options = default_pipeline_options()
+        self._context = None
+        self._workers: List[_Worker] = []
+        # Workers not converting anything, and conversions waiting for one
+        self._idle: deque = deque()
+        self._waiters: deque = deque()
+        self._recycled = 0
+        self._pending = 0
+        # Intra-op threads torch used before pre-fork mode set it to one, for the workers to use
+        self._torch_threads = None
+
+    @property
+    def pending(self) -> int:
+        """Number of conversions running or waiting for a worker."""
+        return self._pending
+
+    @property
+    def workers_ready(self) -> int:
+        """Number of workers that have finished loading their models."""
+        return sum(worker.ready for worker in self._workers)
+
+    @property
+    def workers_broken(self) -> int:
+        """Number of workers whose process has died and not been replaced yet."""
+        return sum(worker.broken for worker in self._workers)
+
+    @property
+    def ready(self) -> bool:
+        """Whether every worker has loaded its models."""
+        return self.workers_ready >= self.workers
+
+    @property
+    def workers_recycled(self) -> int:
+        """Number of workers replaced since the pool started."""
+        return self._recycled
+
+    @property
+    def capacity(self) -> int:
+        """Conversions that can be running or waiting before new ones are rejected."""
+        return self.workers + self.max_backlog
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new conversion would be rejected."""
+        return self._pending >= self.capacity
+
+    def start(self, wait: bool = True) -> None:
+        """Start the worker processes, by default waiting until each has warmed its models.
+
+        Without wait, the workers load their models in the background; conversions
+        submitted meanwhile queue until a worker is ready. In pre-fork mode the
+        models are always loaded here first, before the workers are forked.
+        """
+        if self.prefork:
+            # Load the models once, then fork: the workers share the weights copy-on-write.
+            # Loading on one thread keeps torch from starting the OpenMP thread pool
+            # that forked workers would inherit unusable; they get their threads back.
+            # Freezing the collected objects stops the garbage collector from writing
+            # to (and so copying) the pages that hold them.
+            if not _converters.builds:
+                self._torch_threads = _set_torch_threads(1)
+                _load_converter()
+            gc.freeze()
+            self._context = multiprocessing.get_context("fork")
+        else:
+            # Spawn rather than fork: each worker loads its own models, and a forked one
+            # would inherit torch's thread pool if this process had started it
+            self._context = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(self._context, self.limits, self._torch_threads) for _ in range(self.workers)]
+        self._idle = deque(self._workers)
+        if not wait:
+            return
+        for worker in self._workers:
+            worker.started.result()
+
+    async def _acquire(self) -> _Worker:
+        """Wait for a worker that isn't converting anything, and take it.
+
+        An idle worker that has loaded its models is taken before one still loading them.
+        """
+        for worker in self._idle:
+            if worker.ready:
+                self._idle.remove(worker)
+                return worker
+        if self._idle:
+            return self._idle.popleft()
+        # A future of the running loop rather than an asyncio.Queue, which would stay
+        # bound to the first loop it waited on, while callers may run one loop after another
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())
+            raise
+
+    def _release(self, worker: _Worker) -> None:
+        """Hand a worker to the longest waiting conversion, or put it back as idle."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._idle.append(worker)
+
+    def _recycle(self, worker: _Worker, reason: str) -> _Worker:
+        """Replace a worker process with a fresh one, returning the replacement.
+
+        The worker has no other conversion to finish, since each takes one at a time.
+        """
+        log.info(f"Replacing worker {worker.pid} ({reason})", extra={"pid": worker.pid, "reason": reason})
+        replacement = _Worker(self._context, self.limits, self._torch_threads)
+        self._workers[self._workers.index(worker)] = replacement
+        worker.executor.shutdown(wait=False)
+        self._recycled += 1
+        workers_recycled.inc()
+        return replacement
+
+    def worker_rss(self) -> Dict[int, int]:
+        """RSS of each worker process, keyed by pid (empty where unsupported); cheap enough for /health."""
+        usage = {}
+        for worker in self._workers:
+            rss = current_rss_bytes(worker.pid) if worker.pid is not None else None
+            if rss is not None:
+                usage[worker.pid] = rss
+        return usage
+
+    def worker_memory(self) -> Dict[int, Dict[str, int]]:
+        """RSS, PSS and USS of each worker process, keyed by pid (empty where unsupported).
+
+        Slow for workers holding the models (see memory_usage), so call it off the event loop.
+        """
+        usage = {}
+        for worker in self._workers:
+            memory = memory_usage(worker.pid) if worker.pid is not None else None
+            if memory is not None:
+                usage[worker.pid] = memory
+        return usage
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        for worker in self._workers:
+            worker.executor.shutdown(cancel_futures=True)
+        self._workers = []
+        self._idle.clear()
+
+    async def convert(self, pdf: PdfSource, recipe: str = "default", shard_pages: int = None,
+                      name: str = None, check_backlog: bool = True) -> Dict[str, Any]:
+        """Convert a PDF and apply a recipe, raising PoolSaturatedError if the backlog is full.
+
+        The PDF is converted with the recipe's default pipeline options.
+        """
+        conversion_recipe = registry.get_recipe(recipe)
+        pipeline_options = build_pipeline_options(**conversion_recipe.pipeline_defaults)
+        document = await self.convert_document(pdf, shard_pages=shard_pages, name=name,
+                                               pipeline_options=pipeline_options,
+                                               check_backlog=check_backlog)
+        return await asyncio.to_thread(conversion_recipe.simplify_document, document)
+
+    async def convert_document(self, pdf: PdfSource, shard_pages: int = None, name: str = None,
+                               digest: str = None, pipeline_options: PdfPipelineOptions = None,
+                               pages: Tuple[int, int] = None, check_backlog: bool = True) -> DoclingDocument:
+        """Get the docling document for a PDF from the cache, or convert it on the workers.
+
+        The PDF is a path or the file's bytes; name (by default the file name without
+        its extension) becomes the document's name. A digest already computed for
+        the PDF can be passed to save hashing it again. pipeline_options default to
+        the pool's.
+
+        With pages, a (first, last) 1-based inclusive range, only those pages are
+        converted, keeping their page numbers. With shard_pages set, a longer PDF is
+        split into shards of that many pages, which are converted in parallel and
+        stitched back together.
+
+        With a document store, every document is also kept there under its name.
+
+        PoolSaturatedError is raised if the backlog is full, unless check_backlog is
+        False, for callers that bound how many conversions they queue themselves.
+        """
+        if name is None:
+            name = Path(pdf).stem if isinstance(pdf, str) else "document"
+        if pipeline_options is None:
+            pipeline_options = self.pipeline_options
+
+        document, key = None, None
+        if self.cache is not None or self.store is not None:
+            with stage("cache_lookup"):
+                if digest is None:
+                    digest = await asyncio.to_thread(ConversionCache.pdf_digest, pdf)
+                key = ConversionCache.make_key(digest, pipeline_options, pages)
+                if self.cache is not None:
+                    document = await asyncio.to_thread(self.cache.get, key)
+        if document is not None:
+            await self.store_document(key, document, name, pages)
+            return document
+
+        total_pages = None
+        if self.limits.max_pages or shard_pages:
+            total_pages = await asyncio.to_thread(page_count, pdf)
+            if pages is not None:
+                total_pages = max(0, min(pages[1], total_pages) - pages[0] + 1)
+        if self.limits.max_pages and total_pages > self.limits.max_pages:
+            limit_errors.inc(limit=TooManyPagesError.limit)
+            raise TooManyPagesError(f"PDF has {total_pages} pages, over the {self.limits.max_pages} page limit")
+        sharded = bool(shard_pages) and total_pages > shard_pages
+        conversions = -(-total_pages // shard_pages) if sharded else 1
+
+        # Checked and counted with no await in between, so concurrent requests can't
+        # all pass the check first. A document with more shards than the pool's whole
+        # capacity is still taken when nothing else is pending.
+        if check_backlog and self._pending and self._pending + conversions > self.capacity:
+            raise PoolSaturatedError(f"{self._pending} conversions already pending")
+        self._pending += conversions
+        try:
+            page_offset = 0
+            if pages is not None:
+                with stage("split"):
+                    pdf = await asyncio.to_thread(extract_pages, pdf, *pages)
+                page_offset = pages[0] - 1
+
+            if sharded:
+                document = await self._convert_sharded(pdf, shard_pages, name, pipeline_options, page_offset)
+            else:
+                document = (await self._convert_all([pdf], name, pipeline_options))[0]
+                if page_offset:
+                    with stage("stitch"):
+                        document = await asyncio.to_thread(stitch_documents, [(document, page_offset)], name)
+        finally:
+            self._pending -= conversions
+
+        if self.cache is not None:
+            with stage("cache_store"):
+                await asyncio.to_thread(self.cache.put, key, document)
+        await self.store_document(key, document, name, pages)
+        return document
+
+    async def store_document(self, key: str, document: DoclingDocument, name: str,
+                             pages: Tuple[int, int] = None) -> None:
+        """Keep a document in the document store, if there is one, under its cache key."""
+        if self.store is not None:
+            with stage("store"):
+                await asyncio.to_thread(self.store.put, key, document, store_name(name, pages))
+
+    async def _convert_all(self, pdfs: List[PdfSource], name: str,
+                           pipeline_options: PdfPipelineOptions) -> List[DoclingDocument]:
+        """Convert PDFs concurrently; the caller counts them against the backlog."""
+        recorder = current_recorder()
+        profile = recorder is not None and recorder.cprofile
+
+        try:
+            results = await asyncio.gather(*(
+                self._convert_on_worker(pdf, name, pipeline_options, profile) for pdf in pdfs
+            ))
+        except ConversionLimitError as e:
+            limit_errors.inc(limit=e.limit)
+            raise
+
+        for i, (document, stats) in enumerate(results):
+            if "load_models_seconds" in stats:
+                observe_stage("load_models", stats["load_models_seconds"])
+            converter_builds.inc(stats["converters_built"])
+            converter_evictions.inc(stats["converters_evicted"])
+            observe_stage("docling", stats["seconds"])
+            pages_total.inc(stats["pages"])
+            worker_peak_rss.observe(stats["peak_rss_bytes"])
+            if recorder is not None:
+                recorder.info["pages"] = recorder.info.get("pages", 0) + stats["pages"]
+                recorder.info["worker_peak_rss_bytes"] = max(
+                    recorder.info.get("worker_peak_rss_bytes", 0), stats["peak_rss_bytes"]
+                )
+                if "cprofile" in stats:
+                    name = "docling" if len(results) == 1 else f"docling.shard_{i}"
+                    recorder.profiles[name] = stats["cprofile"]
+
+        # Shards are parts of one document, so count its pages once
+        document_pages.observe(sum(stats["pages"] for _, stats in results))
+        return [document for document, _ in results]
+
+    async def _convert_on_worker(self, pdf: PdfSource, name: str, pipeline_options: PdfPipelineOptions,
+                                 profile: bool) -> Tuple[DoclingDocument, Dict[str, Any]]:
+        """Convert a PDF on the next free worker, on another one if that worker's process dies."""
+        try:
+            return await self._convert_once(pdf, name, pipeline_options, profile)
+        except WorkerCrashedError as e:
+            log.warning(f"Retrying {name} on another worker: {e}", extra={"document": name})
+            return await self._convert_once(pdf, name, pipeline_options, profile)
+
+    async def _convert_once(self, pdf: PdfSource, name: str, pipeline_options: PdfPipelineOptions,
+                            profile: bool) -> Tuple[DoclingDocument, Dict[str, Any]]:
+        """Convert a PDF on the next free worker, killing the worker if it runs past the hard deadline.
+
+        The worker is given back by _finish once the conversion has actually
+        finished, not when this returns: if the caller is cancelled, the worker
+        carries on converting and isn't free until it is done.
+        """
+        worker = await self._acquire()
+        if worker.broken and worker in self._workers:
+            # Its process died while it was idle
+            worker = self._recycle(worker, worker.killed or "crashed")
+        loop = asyncio.get_running_loop()
+        try:
+            future = worker.executor.submit(_convert, pdf, name, pipeline_options, profile)
+        except BrokenExecutor as e:
+            # The process died while idle; _finish replaces it
+            worker.crashed = True
+            future = Future()
+            future.set_exception(e)
+
+        def finished(future: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finish, worker, future)
+            except RuntimeError:
+                # The loop has closed, so nothing on it is waiting for a worker
+                self._finish(worker, future)
+
+        future.add_done_callback(finished)
+
+        try:
+            if self.limits.timeout:
+                # The deadline starts once the worker is up, since a replacement loads its models first
+                await asyncio.shield(asyncio.wrap_future(worker.started))
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(future),
+                                                  self.limits.timeout + self.limits.kill_grace)
+                except asyncio.TimeoutError:
+                    # Stuck somewhere the worker's own timer can't interrupt, e.g. native code
+                    worker.kill("timeout")
+                    raise ConversionTimeoutError(f"Conversion took longer than {self.limits.timeout} seconds")
+            return await asyncio.wrap_future(future)
+        except BrokenExecutor as e:
+            worker.crashed = True
+            raise WorkerCrashedError(f"Worker process died while converting: {e}") from e
+
+    def _finish(self, worker: _Worker, future: Future) -> None:
+        """Give a worker back once its conversion has finished, replacing it first if it is due.
+
+        A worker is replaced after its process died, or was killed; after its
+        conversion was stopped by a limit, which may have left anything behind in
+        it; when it says it is due; and, with a memory limit, after any failed
+        conversion, which may have been an allocation failing in native code.
+        """
+        reason = None
+        if worker.broken:
+            reason = worker.killed or "crashed"
+        elif not future.cancelled():
+            error = future.exception()
+            if isinstance(error, BrokenExecutor):
+                worker.crashed = True
+                reason = worker.killed or "crashed"
+            elif isinstance(error, ConversionLimitError):
+                reason = error.limit
+            elif error is not None:
+                reason = "error" if self.limits.max_memory else None
+            else:
+                reason = future.result()[1]["recycle"]
+        if reason and worker in self._workers:
+            worker = self._recycle(worker, reason)
+        self._release(worker)
+
+    async def _convert_sharded(self, pdf: PdfSource, shard_pages: int, name: str,
+                               pipeline_options: PdfPipelineOptions, page_offset: int = 0) -> DoclingDocument:
+        """Convert page-range shards on separate workers and stitch them in page order.
+
+        page_offset is the number of pages before the PDF, when it is itself a page range.
+        """
+        with stage("split"):
+            shards = await asyncio.to_thread(split_pdf, pdf, shard_pages)
+        documents = await self._convert_all([shard for shard, _ in shards], name, pipeline_options)
+
+        parts = [(document, page_offset + shard_offset)
+                 for document, (_, shard_offset) in zip(documents, shards)]
+        with stage("stitch"):
+            return await asyncio.to_thread(stitch_documents, parts, name)